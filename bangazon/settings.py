@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -46,7 +47,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'bangazonapi.authentication.CustomerTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -54,7 +55,7 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'bangazonapi.pagination.OptionalLimitOffsetPagination',
     'PAGE_SIZE': 10
 }
 
@@ -102,11 +103,49 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-
+        'TEST': {
+            # A file rather than shared-cache memory, so tests with
+            # concurrent threads lock the database the way production does
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+#
+# `default` holds the table versions that invalidate cached responses and
+# tokens, so it must be shared by every worker process. `products` holds
+# the cached product list/detail bodies and is bounded with LRU eviction;
+# it may stay per-process, since its keys embed the shared versions.
+# BANGAZON_CACHE_DIR moves the `default` files out of the project.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'BANGAZON_CACHE_DIR', os.path.join(BASE_DIR, '.django_cache')),
+        'TIMEOUT': None,
+    },
+    'products': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'products',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+if sys.argv[1:2] == ['test']:
+    # Test runs get their own counters instead of the dev server's files
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -143,3 +182,16 @@ APPEND_SLASH = False
 
 MEDIA_ROOT = 'media'
 MEDIA_URL = '/media/'
+
+# Threads that decode and resize uploaded product images after the request
+# returns (bangazonapi/images.py). 0 processes them inline.
+IMAGE_PROCESSING_WORKERS = 2
+
+# Largest image accepted by PUT /products/:id/image
+PRODUCT_IMAGE_MAX_BYTES = 5 * 1024 * 1024
+
+# In-process cache of authenticated tokens (bangazonapi/authentication.py).
+# Entries are dropped after the TTL in seconds, or in every worker when a
+# token is deleted or a user is deactivated. A TTL of 0 disables it.
+AUTH_TOKEN_CACHE_TTL = 30
+AUTH_TOKEN_CACHE_MAX_ENTRIES = 10000
@@ -23,6 +23,9 @@ router.register(r'profile', Profile, 'profile')
 # Wire up our API using automatic URL routing.
 # Additionally, we include login URLs for the browsable API.
 urlpatterns = [
+    # The router only maps GET and POST on list URLs
+    url(r'^cart$', Cart.as_view(
+        {'get': 'list', 'post': 'create', 'patch': 'change_quantities'}), name='cart-list'),
     url(r'^', include(router.urls)),
     url(r'^register$', register_user),
     url(r'^login$', login_user),
@@ -1,5 +1,33 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class BangazonapiConfig(AppConfig):
     name = 'bangazonapi'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from rest_framework.authtoken.models import Token
+        from bangazonapi import authentication, cache, search, sqlite
+        from bangazonapi.models import Customer, LikeProduct, Order, Product, ProductRating
+        from bangazonapi.models.productstats import backfill_product_stats, create_product_stats
+
+        connection_created.connect(sqlite.use_wal)
+
+        post_migrate.connect(search.create_search_index, sender=self)
+        post_save.connect(search.index_product, sender=Product)
+        post_delete.connect(search.unindex_product, sender=Product)
+
+        post_migrate.connect(backfill_product_stats, sender=self)
+        post_save.connect(create_product_stats, sender=Product)
+
+        for signal in (post_save, post_delete):
+            signal.connect(cache.bump_product_version, sender=Product)
+            signal.connect(cache.bump_rating_version, sender=ProductRating)
+            signal.connect(cache.bump_like_version, sender=LikeProduct)
+        post_save.connect(cache.bump_order_version, sender=Order)
+
+        post_delete.connect(authentication.revoke_cached_tokens, sender=Token)
+        post_save.connect(authentication.revoke_on_user_save, sender=User)
+        post_save.connect(authentication.revoke_on_customer_created, sender=Customer)
@@ -0,0 +1,183 @@
+"""Token authentication that also loads the customer of the token's user
+
+Authenticated tokens are remembered in a small in-process LRU cache, so
+most requests skip the token query altogether. An entry holds only the
+ids and the `is_active` flag; the user is loaded lazily if a view reads
+it. Deleting a token, saving a user's `is_active` flag or creating a
+customer bumps the shared `auth` version in the default cache, and every
+worker drops its entries on its next lookup.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from bangazonapi.cache import bump_version, get_version
+from bangazonapi.models import Customer
+
+
+class TokenCache:
+    """Bounded LRU map of token key to (user_id, customer_id, is_active)
+
+    Entries expire `AUTH_TOKEN_CACHE_TTL` seconds after they are stored.
+    Each lookup passes the current shared version; when it differs from
+    the one the entries were stored under, they are all dropped.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        """The cached entry for a token key, or None"""
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+                return None
+
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, version):
+        """Store an entry read while `version` was current"""
+        with self.lock:
+            if version != self.version:
+                return
+
+            self.entries[key] = (value, time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > settings.AUTH_TOKEN_CACHE_MAX_ENTRIES:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def revoke_cached_tokens(sender, **kwargs):
+    """Signal handler dropping the cached tokens of every worker"""
+    bump_version('auth')
+
+
+def revoke_on_user_save(sender, created=False, update_fields=None, **kwargs):
+    """post_save handler for users; only `is_active` affects cached tokens"""
+    if not created and (update_fields is None or 'is_active' in update_fields):
+        bump_version('auth')
+
+
+def revoke_on_customer_created(sender, created=False, **kwargs):
+    """post_save handler for customers; cached tokens store the customer id"""
+    if created:
+        bump_version('auth')
+
+
+def get_full_customer(request):
+    """`request.customer` with every field loaded
+
+    A customer restored from the token cache only has its ids loaded.
+    Views that render the customer itself use this to read the rest in
+    one query.
+
+    Returns:
+        Customer -- The customer, or None
+    """
+    customer = request.customer
+    if customer is not None and customer.get_deferred_fields():
+        customer = Customer.objects.select_related('user').get(pk=customer.pk)
+        request.customer = customer
+
+    return customer
+
+
+class CustomerTokenAuthentication(TokenAuthentication):
+    """`TokenAuthentication` that sets `request.customer`
+
+    The token, its user and the user's customer are read in one joined
+    query, or taken from the token cache, so views use `request.customer`
+    instead of looking the customer up again. It is None for anonymous
+    requests and for users without a customer, such as a bare superuser.
+    """
+
+    def __init__(self):
+        self.customer = None
+
+    def authenticate(self, request):
+        request.customer = None
+
+        credentials = super().authenticate(request)
+        if credentials is not None:
+            request.customer = self.customer
+
+        return credentials
+
+    def authenticate_credentials(self, key):
+        if settings.AUTH_TOKEN_CACHE_TTL <= 0:
+            user, token = self.load_credentials(key)
+            is_active = user.is_active
+        else:
+            version = get_version('auth')
+            entry = token_cache.get(key, version)
+
+            if entry is None:
+                user, token = self.load_credentials(key)
+                entry = (user.id, getattr(self.customer, 'id', None), user.is_active)
+                token_cache.set(key, entry, version)
+            else:
+                user, token = self.restore_credentials(key, *entry)
+
+            is_active = entry[2]
+
+        if not is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return user, token
+
+    def load_credentials(self, key):
+        """Read the token, user and customer from the database"""
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user__customer').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        try:
+            self.customer = token.user.customer
+        except Customer.DoesNotExist:
+            pass
+
+        return token.user, token
+
+    def restore_credentials(self, key, user_id, customer_id, is_active):
+        """Rebuild the credentials from a token cache entry without queries
+
+        The user is loaded on first use, and the customer only has its
+        ids loaded; see `get_full_customer()`.
+        """
+        if customer_id is not None:
+            self.customer = Customer.from_db(
+                DEFAULT_DB_ALIAS, ['id', 'user_id'], [customer_id, user_id])
+
+        token = self.get_model()(key=key, user_id=user_id)
+        user = SimpleLazyObject(lambda: User.objects.get(pk=user_id))
+
+        return user, token
@@ -0,0 +1,165 @@
+"""Versioned response cache for the product endpoints
+
+Cached bodies live in the `products` cache alias, which should be a
+bounded LRU cache (LocMemCache with MAX_ENTRIES). Every key embeds the
+current version of the tables the body was built from. A write to one of
+those tables bumps its version, so later requests use a new key and the
+stale bodies are evicted in LRU order.
+
+The version counters live in the `default` alias, which must be a backend
+shared by every worker process (e.g. file-based) for a bump to reach them
+all. The bodies themselves may be per-process, and the hit/miss counters
+are kept in memory by each process.
+"""
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+from django.core.cache import cache, caches
+from django.db import transaction
+
+
+RESPONSE_CACHE_ALIAS = 'products'
+VERSIONED_TABLES = ('product', 'productrating', 'likeproduct', 'order')
+
+
+def _initial_version():
+    # Start from the clock so a counter lost to eviction never reuses an old value
+    return int(time.time() * 1000)
+
+
+def bump_version(table):
+    """Invalidate every cached body that was built from `table`"""
+    key = f'version:{table}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+
+
+def bump_version_on_commit(table):
+    """Bump `table`'s version once the current transaction commits
+
+    A body built between an earlier bump and the commit would be read
+    from the old rows yet stored under the new version. Outside a
+    transaction the version is bumped at once.
+    """
+    transaction.on_commit(lambda: bump_version(table))
+
+
+def get_version(table):
+    """The current version of one table"""
+    key = f'version:{table}'
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def table_versions():
+    """The current version of every table the product bodies depend on
+
+    Returns:
+        str -- Versions joined with dots, for use in a cache key
+    """
+    keys = [f'version:{table}' for table in VERSIONED_TABLES]
+    versions = cache.get_many(keys)
+
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def response_cache_key(request, name):
+    """Cache key for a request, built from its normalized query params
+
+    The scheme and host are included because the bodies contain absolute
+    URLs.
+
+    Arguments:
+        request {Request} -- The current request
+        name {str} -- Name of the endpoint, e.g. `list` or `retrieve:4`
+
+    Returns:
+        str -- The cache key
+    """
+    params = sorted(
+        (key, sorted(values)) for key, values in request.query_params.lists())
+    signature = '|'.join((
+        request.scheme, request.get_host(), name, urlencode(params, doseq=True)))
+    digest = hashlib.md5(signature.encode('utf-8')).hexdigest()
+
+    return f'products:{table_versions()}:{digest}'
+
+
+_counters = {'hits': 0, 'misses': 0}
+_counters_lock = threading.Lock()
+
+
+def _count(counter):
+    # In memory, so a cache hit does not pay for a write to the shared cache
+    with _counters_lock:
+        _counters[counter] += 1
+
+
+def cached_response(request, name, build):
+    """Fetch a response body from the cache, building and storing it on a miss
+
+    Arguments:
+        request {Request} -- The current request
+        name {str} -- Name of the endpoint, e.g. `list` or `retrieve:4`
+        build {callable} -- Builds the body when it is not cached
+
+    Returns:
+        tuple -- (body, True when it came from the cache)
+    """
+    responses = caches[RESPONSE_CACHE_ALIAS]
+    key = response_cache_key(request, name)
+
+    body = responses.get(key)
+    if body is not None:
+        _count('hits')
+        return body, True
+
+    _count('misses')
+    body = build()
+    responses.set(key, body)
+
+    return body, False
+
+
+def cache_stats():
+    """Hit and miss counters of the product response cache
+
+    Returns:
+        dict -- `hits` and `misses` of this worker process since it started
+    """
+    with _counters_lock:
+        return dict(_counters)
+
+
+def bump_product_version(sender, **kwargs):
+    """post_save/post_delete handler for products"""
+    bump_version_on_commit('product')
+
+
+def bump_rating_version(sender, **kwargs):
+    """post_save/post_delete handler for product ratings"""
+    bump_version_on_commit('productrating')
+
+
+def bump_like_version(sender, **kwargs):
+    """post_save/post_delete handler for product likes"""
+    bump_version_on_commit('likeproduct')
+
+
+def bump_order_version(sender, instance, **kwargs):
+    """post_save handler for orders; only paid orders change product bodies"""
+    if instance.payment_type_id is not None:
+        bump_version_on_commit('order')
@@ -0,0 +1,75 @@
+"""Conditional GET support (ETag / Last-Modified) for ViewSet methods"""
+import functools
+import hashlib
+from datetime import datetime
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def auth_user_id(request):
+    """Id of the token's user, or None for anonymous requests"""
+    return request.auth.user_id if request.auth is not None else None
+
+
+def conditional(validators, last_modified=True):
+    """Decorate a ViewSet handler with weak ETag and Last-Modified validators
+
+    `validators(view, request, *args, **kwargs)` must return a dict of
+    cheap aggregates describing the rows behind the response, such as a
+    row count and the newest `updated_at` of each table involved. It runs
+    before the handler, so a matching `If-None-Match` or
+    `If-Modified-Since` gets a 304 without the body ever being built.
+
+    The newest datetime in the dict becomes `Last-Modified`. The ETag
+    hashes every value together with the user and the query string,
+    because both change the body.
+
+    Deleting a row leaves the newest `updated_at` of the rest unchanged,
+    so responses built from a set of rows pass `last_modified=False`.
+    Their ETag still changes, because it includes the row counts.
+
+    Arguments:
+        validators {callable} -- Builds the aggregates for a request
+        last_modified {bool} -- Send and honor `Last-Modified`
+
+    Returns:
+        callable -- The decorator
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return handler(view, request, *args, **kwargs)
+
+            values = validators(view, request, *args, **kwargs)
+
+            timestamps = [
+                value for value in values.values() if isinstance(value, datetime)]
+            modified = None
+            if last_modified and timestamps:
+                modified = int(max(timestamps).timestamp())
+
+            signature = repr((
+                auth_user_id(request),
+                sorted(request.query_params.lists()),
+                sorted(values.items()),
+            ))
+            etag = 'W/"{}"'.format(
+                hashlib.md5(signature.encode('utf-8')).hexdigest())
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=modified)
+            if response is None:
+                response = handler(view, request, *args, **kwargs)
+
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if modified is not None:
+                    response['Last-Modified'] = http_date(modified)
+                patch_vary_headers(response, ('Authorization',))
+
+            return response
+
+        return wrapper
+
+    return decorator
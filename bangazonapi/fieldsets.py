@@ -0,0 +1,83 @@
+"""Sparse fieldsets (`?fields=`) and relation expansion (`?expand=`)
+
+Both query params take comma separated field names and apply to the
+top-level serializer of a response only; nested serializers keep all of
+their fields. Views use `wants()` and `expands()` to skip the joins and
+queries behind fields that will not be rendered.
+"""
+from rest_framework.serializers import ListSerializer
+
+
+def param_names(request, name):
+    """The comma separated names in a query param
+
+    Returns:
+        set -- The names, or None when the param was not sent
+    """
+    if request is None or name not in request.query_params:
+        return None
+
+    return {
+        field.strip() for field in request.query_params[name].split(',')
+        if field.strip()
+    }
+
+
+def wants(request, *fields):
+    """Whether the response will contain any of `fields`
+
+    Arguments:
+        request {Request} -- The current request
+        fields {str} -- Names of top-level fields
+
+    Returns:
+        bool -- False only when `?fields=` leaves all of them out
+    """
+    requested = param_names(request, 'fields')
+    return requested is None or not requested.isdisjoint(fields)
+
+
+def expands(request, field):
+    """Whether `?expand=` asks for the relation `field`"""
+    return field in (param_names(request, 'expand') or ())
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin honoring `?fields=` and `?expand=`
+
+    `expandable_fields` maps a relation name to a callable building the
+    nested serializer used when the relation is expanded. Expanded
+    relations are rendered even when `?fields=` leaves them out, and so
+    is `id`, which clients need to tell the items apart.
+    """
+    expandable_fields = {}
+
+    @property
+    def is_root(self):
+        """True for the serializer (or list item) the response is built from"""
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def field_requested(self, field):
+        """Whether `field` will be rendered by this serializer"""
+        return not self.is_root or wants(self.context.get('request'), field)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_root:
+            return fields
+
+        request = self.context.get('request')
+
+        expanded = set(self.expandable_fields) & (param_names(request, 'expand') or set())
+        for name in expanded:
+            fields[name] = self.expandable_fields[name]()
+
+        requested = param_names(request, 'fields')
+        if requested is not None:
+            for name in set(fields) - requested - expanded - {'id'}:
+                del fields[name]
+
+        return fields
@@ -0,0 +1,249 @@
+"""Background processing of uploaded product images
+
+Uploads are handed to a small thread pool once the product row is
+committed, so the request never waits on decoding or resizing. A worker
+decodes and validates the image, re-encodes it without its metadata
+(EXIF, GPS, comments) and writes a thumbnail and a medium variant. Until
+then the product's `image_status` is `pending`.
+
+Set `IMAGE_PROCESSING_WORKERS` to 0 to process images inline, e.g. in
+tests.
+"""
+import base64
+import binascii
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+from bangazonapi.cache import bump_version
+from bangazonapi.models import Product
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+VARIANTS = {
+    'image_thumbnail': (150, 150),
+    'image_medium': (600, 600),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class InvalidImage(Exception):
+    """The upload is not an image in one of the accepted formats"""
+
+
+def get_executor():
+    """The shared worker pool, created on first use"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix='product-images')
+
+    return _executor
+
+
+class ImageSizeLimitHandler(FileUploadHandler):
+    """Upload handler that stops a file upload once it passes the size cap
+
+    Install it ahead of the regular handlers. It counts the chunks as they
+    stream in, so an oversized upload stops being stored once it passes
+    the cap, and sets `too_large` for the view to report. The rest of the
+    body is drained rather than the connection reset, so the client still
+    gets the 413.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.received = 0
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.PRODUCT_IMAGE_MAX_BYTES:
+            self.too_large = True
+            raise StopUpload(connection_reset=False)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def sniff_image_format(upload):
+    """Detect the image format of an upload from its leading bytes
+
+    The client's declared content type is not trusted.
+
+    Arguments:
+        upload {UploadedFile} -- The uploaded file
+
+    Returns:
+        str -- A key of IMAGE_FORMATS, or None when it is not a known image
+    """
+    upload.seek(0)
+    header = upload.read(12)
+    upload.seek(0)
+
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def decode_data_url(data_url):
+    """Split a `data:image/png;base64,...` string into its raw bytes
+
+    Raises:
+        InvalidImage -- When the string is not base64 encoded
+    """
+    try:
+        _, encoded = data_url.split(';base64,')
+        return base64.b64decode(encoded)
+    except (ValueError, binascii.Error):
+        raise InvalidImage('Image must be a base64 data URL.')
+
+
+def open_image(data):
+    """Validate raw upload bytes and load the image
+
+    Returns:
+        tuple -- (the decoded image, its format name)
+
+    Raises:
+        InvalidImage -- When the bytes are not an accepted image
+    """
+    try:
+        # verify() checks the file structure but leaves the image unusable
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+            image_format = image.format
+
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise InvalidImage('Upload is not a valid image.')
+
+    if image_format not in IMAGE_FORMATS:
+        raise InvalidImage(f'{image_format} images are not accepted.')
+
+    return image, image_format
+
+
+def encode_image(image, image_format):
+    """Re-encode pixel data only, dropping EXIF and other metadata"""
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    # The encoders only write EXIF, ICC profiles and comments found in info
+    clean = image.copy()
+    clean.info = {
+        key: value for key, value in image.info.items() if key == 'transparency'}
+
+    output = io.BytesIO()
+    clean.save(output, format=image_format)
+    return output.getvalue()
+
+
+def resize_image(image, size):
+    """A copy of `image` scaled down to fit within `size`"""
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    return variant
+
+
+def process_product_image(product_id, data_url=None):
+    """Store the cleaned original and the variants of a product image
+
+    Arguments:
+        product_id {int} -- Product the image belongs to
+        data_url {str} -- Base64 data URL (default: re-read the stored `image_path`)
+    """
+    product = Product.all_objects.get(pk=product_id)
+
+    try:
+        if data_url is not None:
+            data = decode_data_url(data_url)
+        else:
+            with product.image_path.open('rb') as original:
+                data = original.read()
+
+        image, image_format = open_image(data)
+    except (InvalidImage, OSError, ValueError) as ex:
+        logger.warning('Product %s image rejected: %s', product_id, ex)
+        Product.all_objects.filter(pk=product_id).update(
+            image_status=Product.IMAGE_FAILED, updated_at=timezone.now())
+        bump_version('product')
+        return
+
+    ext = IMAGE_FORMATS[image_format]
+    files = {
+        'image_path': encode_image(image, image_format),
+    }
+    for field, size in VARIANTS.items():
+        files[field] = encode_image(resize_image(image, size), image_format)
+
+    names = {}
+    for field, content in files.items():
+        model_field = Product._meta.get_field(field)
+        name = model_field.generate_filename(product, f'{product_id}.{ext}')
+        names[field] = model_field.storage.save(name, ContentFile(content))
+
+    old_names = {
+        field: getattr(product, field).name for field in files
+        if getattr(product, field)
+    }
+
+    Product.all_objects.filter(pk=product_id).update(
+        image_status=Product.IMAGE_READY, updated_at=timezone.now(), **names)
+    bump_version('product')
+
+    for field, name in old_names.items():
+        if name != names[field]:
+            getattr(product, field).storage.delete(name)
+
+
+def run_job(product_id, data_url):
+    """Worker entry point; each worker thread has its own DB connection"""
+    try:
+        process_product_image(product_id, data_url)
+    except Exception:
+        logger.exception('Processing the image of product %s failed', product_id)
+    finally:
+        if settings.IMAGE_PROCESSING_WORKERS:
+            connection.close()
+
+
+def schedule_product_image(product, data_url=None):
+    """Process the image of `product` once the current transaction commits
+
+    Marks the product pending; the caller saves it.
+
+    Arguments:
+        product {Product} -- Product being saved
+        data_url {str} -- Base64 data URL (default: re-read the stored `image_path`)
+    """
+    product.image_status = Product.IMAGE_PENDING
+
+    def submit():
+        if settings.IMAGE_PROCESSING_WORKERS:
+            get_executor().submit(run_job, product.id, data_url)
+        else:
+            run_job(product.id, data_url)
+
+    transaction.on_commit(submit)
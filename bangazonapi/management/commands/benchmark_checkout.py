@@ -0,0 +1,130 @@
+"""Management command measuring concurrent checkouts on SQLite"""
+import threading
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from bangazonapi.models import (Customer, Order, OrderProduct, Payment, Product,
+                                ProductCategory)
+from bangazonapi.models.order import OutOfStock
+
+
+class Command(BaseCommand):
+    help = 'Measure checkouts per second with buyers racing for one product'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Concurrent buyers (default: 8)')
+        parser.add_argument(
+            '--orders', type=int, default=400,
+            help='Open orders to check out, one unit each (default: 400)')
+        parser.add_argument(
+            '--stock', type=int, default=300,
+            help='Units of the product in stock (default: 300)')
+
+    def handle(self, *args, **options):
+        threads, count, stock = options['threads'], options['orders'], options['stock']
+        if min(threads, count) < 1:
+            raise CommandError('--threads and --orders must be at least 1')
+        if stock < 0:
+            raise CommandError('--stock cannot be negative')
+
+        # The threads need committed rows, so the run uses a scratch copy of
+        # the schema, the test database, which is dropped afterwards
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+
+            product, orders = self.create_orders(count, stock)
+            results, elapsed = self.run(orders, threads)
+
+            product.refresh_from_db()
+            paid = Order.objects.filter(payment_type__isnull=False).count()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if product.quantity != stock - paid:
+            raise CommandError(f'{paid} units were sold but stock went from {stock} to {product.quantity}')
+
+        self.stdout.write(f'Journal mode          {journal_mode}')
+        self.stdout.write(f'Threads               {threads}')
+        self.stdout.write(f'Paid                  {results["paid"]}')
+        self.stdout.write(f'Out of stock          {results["short"]}')
+        self.stdout.write(f'Database locked       {results["locked"]}')
+        self.stdout.write(f'Stock left            {product.quantity}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{count / elapsed:.0f} checkouts/s ({elapsed * 1000:.0f} ms for {count})'))
+
+    def create_orders(self, count, stock):
+        """Insert a product and `count` buyers with one unit of it in their cart
+
+        Returns:
+            tuple -- (product, list of (order, payment) pairs)
+        """
+        with transaction.atomic():
+            seller = Customer.objects.create(
+                user=User.objects.create_user(username='benchmark-seller'),
+                phone_number='555-1212', address='100 Infinity Way')
+            product = Product.objects.create(
+                name='Kite', price=14.99, description='It flies high', quantity=stock,
+                location='Pittsburgh', customer=seller,
+                category=ProductCategory.objects.create(name='Benchmark'))
+
+            orders = []
+            for index in range(count):
+                buyer = Customer.objects.create(
+                    user=User.objects.create_user(username=f'benchmark-buyer-{index}'),
+                    phone_number='555-1212', address='100 Infinity Way')
+                payment = Payment.objects.create(
+                    merchant_name='American Express', account_number='111-1111-1111',
+                    customer=buyer, expiration_date='2024-12-31', create_date='2019-04-12')
+                order, _ = Order.objects.get_or_create_open(buyer)
+                OrderProduct.objects.change_quantity(order, product.id, 1)
+                orders.append((order, payment))
+
+        return product, orders
+
+    def run(self, orders, threads):
+        """Check out `orders` from `threads` threads that start together
+
+        Returns:
+            tuple -- (outcome counts, elapsed seconds)
+        """
+        results = {'paid': 0, 'short': 0, 'locked': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads + 1)
+
+        def buy(share):
+            barrier.wait()
+            try:
+                for order, payment in share:
+                    try:
+                        Order.objects.checkout(order, payment)
+                        outcome = 'paid'
+                    except OutOfStock:
+                        outcome = 'short'
+                    except OperationalError:
+                        outcome = 'locked'
+
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=buy, args=(orders[index::threads],))
+            for index in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+
+        barrier.wait()
+        start = time.perf_counter()
+        for worker in workers:
+            worker.join()
+
+        return results, time.perf_counter() - start
@@ -0,0 +1,87 @@
+"""Management command comparing the two product serializers"""
+import timeit
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from bangazonapi.models import Customer, Product, ProductCategory
+from bangazonapi.views.product import ProductRowSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'Time ProductSerializer against the ProductRowSerializer fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products', type=int, default=1000,
+            help='Number of products to serialize (default: 1000)')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Timed runs per serializer; the best one is reported (default: 5)')
+        parser.add_argument(
+            '--query', default='',
+            help='Query string of the simulated request, e.g. "fields=id,name"')
+
+    def handle(self, *args, **options):
+        count = options['products']
+        if count < 1:
+            raise CommandError('--products must be at least 1')
+
+        request = Request(APIRequestFactory().get(
+            f"/products?{options['query']}", HTTP_HOST='localhost'))
+        context = {'request': request, 'customer_flags': False}
+
+        # The sample products are rolled back once the timings are taken
+        with transaction.atomic():
+            category = self.create_products(count)
+            products = Product.objects.filter(
+                category=category).with_aggregates().order_by('id')
+
+            def drf():
+                return ProductSerializer(products.all(), many=True, context=context).data
+
+            def fast():
+                rows = ProductRowSerializer(request)
+                return rows.to_representation(rows.values(products.all()))
+
+            if JSONRenderer().render(drf()) != JSONRenderer().render(fast()):
+                raise CommandError('The serializers rendered different bodies')
+
+            timings = {
+                name: min(timeit.repeat(serialize, number=1, repeat=options['repeat']))
+                for name, serialize in (('ProductSerializer', drf),
+                                        ('ProductRowSerializer', fast))
+            }
+
+            transaction.set_rollback(True)
+
+        for name, seconds in timings.items():
+            self.stdout.write(
+                f'{name:<22}{seconds * 1000:10.1f} ms'
+                f'{seconds / count * 1e6:10.1f} us/product')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Fast path is {timings['ProductSerializer'] / timings['ProductRowSerializer']:.1f}x "
+            f'faster for {count} products'))
+
+    def create_products(self, count):
+        """Insert `count` sample products in a new category
+
+        Returns:
+            ProductCategory -- The category holding only the sample products
+        """
+        user = User.objects.create_user(username='benchmark-seller')
+        customer = Customer.objects.create(
+            user=user, phone_number='555-1212', address='100 Infinity Way')
+        category = ProductCategory.objects.create(name='Benchmark')
+
+        Product.objects.bulk_create([
+            Product(name=f'Product {index}', customer=customer, price=index % 500 + 0.99,
+                    description='Benchmark product', quantity=index % 50,
+                    category=category, location='Nashville')
+            for index in range(count)
+        ], batch_size=500)
+
+        return category
@@ -0,0 +1,67 @@
+"""Management command measuring the token cache on GET /profile"""
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from bangazonapi.authentication import token_cache
+from bangazonapi.models import Customer
+
+
+class Command(BaseCommand):
+    help = 'Compare GET /profile requests per second with and without the token cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Requests per run (default: 2000)')
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        if count < 1:
+            raise CommandError('--requests must be at least 1')
+
+        # The sample customer is rolled back once the timings are taken
+        with transaction.atomic():
+            user = User.objects.create_user(username='benchmark-customer')
+            Customer.objects.create(
+                user=user, phone_number='555-1212', address='100 Infinity Way')
+            token = Token.objects.create(user=user)
+
+            client = Client(
+                SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+            results = {}
+            for name, ttl in (('Without token cache', 0), ('With token cache', 30)):
+                token_cache.clear()
+                with override_settings(AUTH_TOKEN_CACHE_TTL=ttl):
+                    results[name] = self.run(client, count)
+
+            transaction.set_rollback(True)
+
+        for name, (per_second, queries) in results.items():
+            self.stdout.write(
+                f'{name:<22}{per_second:10.0f} req/s{queries:6} queries/request')
+
+    def run(self, client, count):
+        """Send `count` GET /profile requests after a warm-up one
+
+        Returns:
+            tuple -- (requests per second, queries of the last request)
+        """
+        client.get('/profile')
+
+        start = time.perf_counter()
+        for _ in range(count - 1):
+            client.get('/profile')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/profile')
+        elapsed = time.perf_counter() - start
+
+        if response.status_code != 200:
+            raise CommandError(f'GET /profile answered {response.status_code}')
+
+        return count / elapsed, len(queries)
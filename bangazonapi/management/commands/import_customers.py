@@ -0,0 +1,148 @@
+"""Management command bulk-creating customers from a CSV or JSON Lines file"""
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from bangazonapi.models import Customer
+
+
+IMPORT_FIELDS = ('username', 'email', 'password', 'first_name', 'last_name',
+                 'phone_number', 'address')
+LOOKUP_BATCH_SIZE = 500
+
+
+def read_rows(path):
+    """Read customer rows from a `.csv` file with a header line, or JSON Lines
+
+    Returns:
+        list -- (line number, row dict) pairs
+    """
+    with open(path, newline='', encoding='utf-8') as source:
+        if path.endswith('.csv'):
+            # Line 1 is the header
+            return list(enumerate(csv.DictReader(source), start=2))
+
+        try:
+            return [(number, json.loads(line))
+                    for number, line in enumerate(source, start=1) if line.strip()]
+        except json.JSONDecodeError as ex:
+            raise CommandError(f'{path} is not valid JSON Lines: {ex}')
+
+
+def row_errors(rows):
+    """Problems that would stop rows from being imported
+
+    Returns:
+        list -- Messages naming the offending line
+    """
+    errors = []
+    seen = set()
+
+    # Compare usernames the way they will be stored
+    for number, row in rows:
+        if not isinstance(row, dict):
+            errors.append(f'Line {number}: expected an object')
+            continue
+
+        username = User.normalize_username(row.get('username'))
+        missing = [field for field in IMPORT_FIELDS if not row.get(field)]
+        if missing:
+            errors.append(f'Line {number}: missing {", ".join(missing)}')
+        elif username in seen:
+            errors.append(f'Line {number}: username {username} appears more than once')
+
+        seen.add(username)
+
+    usernames = [User.normalize_username(row['username'])
+                 for _, row in rows if isinstance(row, dict) and row.get('username')]
+    for start in range(0, len(usernames), LOOKUP_BATCH_SIZE):
+        taken = User.objects.filter(
+            username__in=usernames[start:start + LOOKUP_BATCH_SIZE]
+        ).values_list('username', flat=True)
+        errors += [f'Username {username} is already taken' for username in taken]
+
+    return errors
+
+
+def hash_passwords(passwords, workers):
+    """Hash passwords with the default hasher, in parallel when workers > 1
+
+    PBKDF2 is CPU-bound, so the work is spread over processes rather
+    than threads.
+    """
+    if workers <= 1:
+        return [make_password(password) for password in passwords]
+
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+class Command(BaseCommand):
+    help = 'Create users, customers and auth tokens from a .csv or .jsonl file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help=f'File with the fields {", ".join(IMPORT_FIELDS)}; '
+                 'CSV when it ends in .csv, JSON Lines otherwise')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Processes hashing passwords (default: one per CPU)')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Rows per INSERT statement (default: 500)')
+
+    def handle(self, *args, **options):
+        try:
+            rows = read_rows(options['path'])
+        except OSError as ex:
+            raise CommandError(ex)
+
+        errors = row_errors(rows)
+        if errors:
+            for error in errors:
+                self.stderr.write(error)
+            raise CommandError(f'Found {len(errors)} problems; nothing was imported')
+
+        rows = [row for _, row in rows]
+        hashes = hash_passwords([row['password'] for row in rows], options['workers'])
+
+        users = [
+            User(username=User.normalize_username(row['username']),
+                 email=User.objects.normalize_email(row['email']),
+                 first_name=row['first_name'], last_name=row['last_name'],
+                 password=password)
+            for row, password in zip(rows, hashes)
+        ]
+
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=batch_size)
+
+            # SQLite does not return the ids of bulk inserted rows
+            user_ids = {}
+            for start in range(0, len(users), LOOKUP_BATCH_SIZE):
+                user_ids.update(User.objects.filter(
+                    username__in=[user.username for user in users[start:start + LOOKUP_BATCH_SIZE]]
+                ).values_list('username', 'id'))
+
+            Customer.objects.bulk_create([
+                Customer(user_id=user_ids[user.username],
+                         phone_number=row['phone_number'], address=row['address'])
+                for user, row in zip(users, rows)
+            ], batch_size=batch_size)
+
+            # bulk_create skips Token.save(), which is what generates the key
+            tokens = [Token(user_id=user_ids[user.username]) for user in users]
+            for token in tokens:
+                token.key = token.generate_key()
+            Token.objects.bulk_create(tokens, batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {len(users)} customers'))
@@ -0,0 +1,31 @@
+"""Management command for reconciling the ProductStats table"""
+from django.core.management.base import BaseCommand, CommandError
+from bangazonapi.models import ProductStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product stats table from orders, ratings and likes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report drift between the stats table and the source tables')
+
+    def handle(self, *args, **options):
+        mismatches = ProductStats.objects.drift()
+
+        for product_id, field, stored, expected in mismatches:
+            self.stdout.write(
+                f'Product {product_id}: {field} is {stored}, expected {expected}')
+
+        if options['check']:
+            if mismatches:
+                raise CommandError(
+                    f'Found {len(mismatches)} drifted product stats values')
+
+            self.stdout.write(self.style.SUCCESS('Product stats are up to date'))
+            return
+
+        count = ProductStats.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt stats for {count} products ({len(mismatches)} values had drifted)'))
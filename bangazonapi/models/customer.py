@@ -7,3 +7,4 @@ class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.DO_NOTHING,)
     phone_number = models.CharField(max_length=15)
     address = models.CharField(max_length=55)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
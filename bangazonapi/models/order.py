@@ -1,10 +1,154 @@
 """Customer order model"""
-from django.db import models
+import datetime
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+from bangazonapi.cache import bump_version_on_commit
 from .customer import Customer
+from .orderproduct import OrderProduct
 from .payment import Payment
+from .product import Product
+from .productstats import ProductStats
+
+
+class OutOfStock(Exception):
+    """Checkout found line items with more units than are in stock
+
+    `items` lists each of them as a dict with `product_id`, `requested`
+    and `available`.
+    """
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.items = items
+
+
+class OrderManager(models.Manager):
+    """Keeps at most one open order (cart) per customer"""
+
+    def get_or_create_open(self, customer, retries=3):
+        """The customer's open order, created if they have none
+
+        The partial unique constraint on open orders makes a concurrent
+        request's INSERT fail instead of adding a second cart. The loser
+        rolls back its savepoint and reads the winner's order; if that
+        order was paid in between, it tries again.
+
+        Arguments:
+            customer {Customer} -- Owner of the cart
+            retries {int} -- Attempts before giving up
+
+        Returns:
+            tuple -- (order, created)
+        """
+        for attempt in range(retries):
+            try:
+                return self.get(customer=customer, payment_type=None), False
+            except self.model.DoesNotExist:
+                pass
+
+            try:
+                with transaction.atomic():
+                    return self.create(
+                        customer=customer, created_date=datetime.date.today()), True
+            except IntegrityError:
+                if attempt == retries - 1:
+                    raise
+
+    def checkout(self, order, payment):
+        """Pay for an open order and take its units out of stock
+
+        Everything happens in one transaction. Its first statement claims
+        the order with UPDATE ... WHERE payment_type IS NULL, which takes
+        SQLite's write lock before anything is read, so concurrent
+        checkouts queue up instead of failing to upgrade a read lock.
+        Each product is then decremented with UPDATE ... SET quantity =
+        quantity - n WHERE quantity >= n, which never oversells. Finally
+        the prices paid are copied to the line items' `unit_price` and
+        the order's `subtotal` and `item_count`, so later price changes do
+        not alter past orders.
+
+        Arguments:
+            order {Order} -- The order to pay for
+            payment {Payment} -- Payment type to pay with
+
+        Returns:
+            bool -- False when the order was already paid
+
+        Raises:
+            OutOfStock -- Nothing was written, because of these line items
+        """
+        now = timezone.now()
+
+        with transaction.atomic():
+            claimed = self.filter(pk=order.pk, payment_type=None).update(
+                payment_type=payment, updated_at=now)
+            if not claimed:
+                return False
+
+            lines = list(OrderProduct.objects.filter(order=order).values_list(
+                'id', 'product_id', 'quantity', 'product__price'))
+
+            short = {}
+            for _, product_id, quantity, _ in lines:
+                taken = Product.objects.filter(pk=product_id, quantity__gte=quantity).update(
+                    quantity=F('quantity') - quantity, updated_at=now)
+                if not taken:
+                    short[product_id] = quantity
+
+            if short:
+                available = dict(Product.objects.filter(
+                    pk__in=short).values_list('id', 'quantity'))
+                raise OutOfStock([
+                    {'product_id': product_id, 'requested': quantity,
+                     'available': available.get(product_id, 0)}
+                    for product_id, quantity in short.items()
+                ])
+
+            OrderProduct.objects.bulk_update([
+                OrderProduct(id=line_id, unit_price=price, updated_at=now)
+                for line_id, _, _, price in lines
+            ], ['unit_price', 'updated_at'])
+
+            totals = {
+                'subtotal': round(sum(price * quantity for _, _, quantity, price in lines), 2),
+                'item_count': sum(quantity for _, _, quantity, _ in lines),
+            }
+            self.filter(pk=order.pk).update(**totals)
+
+            ProductStats.objects.record_sale(order)
+
+            # Queryset updates send no post_save, so do the handlers' work here
+            bump_version_on_commit('product')
+            bump_version_on_commit('order')
+
+        order.payment_type = payment
+        order.updated_at = now
+        order.subtotal = totals['subtotal']
+        order.item_count = totals['item_count']
+        return True
 
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING,)
     payment_type = models.ForeignKey(Payment, on_delete=models.DO_NOTHING, null=True)
     created_date = models.DateField(default="0000-00-00",)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+    # Set by checkout(); None while the order is open
+    subtotal = models.FloatField(null=True)
+    item_count = models.PositiveIntegerField(null=True)
+
+    objects = OrderManager()
+
+    class Meta:
+        constraints = [
+            # A customer has at most one open order (their cart), which
+            # is found through this partial index
+            models.UniqueConstraint(fields=['customer'], name='order_open_uniq',
+                                    condition=models.Q(payment_type__isnull=True)),
+        ]
+        indexes = [
+            # A customer's orders by date
+            models.Index(fields=['customer', 'created_date'],
+                         name='order_customer_created_idx'),
+        ]
@@ -1,12 +1,73 @@
-from django.db import models
+from django.core.validators import MinValueValidator
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+class OrderProductManager(models.Manager):
+    """Keeps one line item per product and order, counting units in `quantity`"""
+
+    def change_quantity(self, order, product_id, delta):
+        """Add (delta > 0) or remove (delta < 0) units of a product
+
+        The quantity is changed with an UPDATE ... SET quantity = quantity
+        + delta, so concurrent changes are not lost. The line item is
+        created for the first units and deleted when its last unit is
+        removed, or when more units are removed than it holds. Both steps
+        run in one transaction whose first statement is the UPDATE, so
+        concurrent removals queue up on SQLite's write lock instead of
+        each deciding from the same old quantity.
+
+        Arguments:
+            order {Order} -- The order holding the line item
+            product_id {int} -- Product whose units change
+            delta {int} -- Number of units to add or remove
+        """
+        line = self.filter(order=order, product_id=product_id)
+
+        with transaction.atomic():
+            quantity = F('quantity') + delta
+            if delta < 0:
+                # The column refuses negative values, so stop at zero
+                quantity = Greatest(quantity, 0)
+
+            updated = line.update(quantity=quantity, updated_at=timezone.now())
+            if delta < 0:
+                line.filter(quantity__lte=0).delete()
+            if updated or delta <= 0:
+                return
+
+            try:
+                with transaction.atomic():
+                    self.create(order=order, product_id=product_id, quantity=delta)
+            except IntegrityError:
+                # Another request created the line first, so add to it
+                line.update(quantity=F('quantity') + delta, updated_at=timezone.now())
 
 
 class OrderProduct(models.Model):
 
+    # The (order, product) unique index also serves lookups by order
     order = models.ForeignKey("Order",
                               on_delete=models.DO_NOTHING,
-                              related_name="lineitems")
+                              related_name="lineitems",
+                              db_index=False)
 
     product = models.ForeignKey("Product",
                                 on_delete=models.DO_NOTHING,
                                 related_name="lineitems")
+    quantity = models.PositiveIntegerField(
+        default=1, validators=[MinValueValidator(1)])
+    # Price of one unit when the order was paid; None while it is open
+    unit_price = models.FloatField(null=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    objects = OrderProductManager()
+
+    class Meta:
+        constraints = [
+            # One line item per product; more units raise its quantity
+            models.UniqueConstraint(fields=['order', 'product'],
+                                    name='orderproduct_order_product_uniq'),
+        ]
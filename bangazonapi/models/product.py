@@ -1,16 +1,55 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F, Sum
+from safedelete.managers import SafeDeleteManager, SafeDeleteAllManager, SafeDeleteDeletedManager
 from safedelete.models import SafeDeleteModel
 from safedelete.models import SOFT_DELETE
+from safedelete.queryset import SafeDeleteQueryset
 from .customer import Customer
 from .productcategory import ProductCategory
 from .orderproduct import OrderProduct
 from .productrating import ProductRating
 
 
+class ProductQuerySet(SafeDeleteQueryset):
+    """Product queryset that can read the sales and rating aggregates in SQL"""
+
+    def with_aggregates(self):
+        """Annotate each product with `sold_count` and `rating_average`
+
+        Both values come from the joined `ProductStats` row, so the whole
+        page of products is fetched in a single query instead of two extra
+        aggregate queries per row. They are plain column references, so
+        filtering and sorting on them can use the stats indexes. Every
+        product has a stats row (see `create_product_stats`); both values
+        are None for one whose row was removed.
+
+        Returns:
+            ProductQuerySet -- The annotated queryset
+        """
+        return self.annotate(
+            sold_count=F('stats__sold_count'),
+            rating_average=F('stats__average_rating'),
+        )
+
+
 class Product(SafeDeleteModel):
 
     _safedelete_policy = SOFT_DELETE
+    objects = SafeDeleteManager.from_queryset(ProductQuerySet)()
+    all_objects = SafeDeleteAllManager.from_queryset(ProductQuerySet)()
+    deleted_objects = SafeDeleteDeletedManager.from_queryset(ProductQuerySet)()
+
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+
     name = models.CharField(max_length=50,)
     customer = models.ForeignKey(
         Customer, on_delete=models.DO_NOTHING, related_name='products')
@@ -25,17 +64,32 @@ class Product(SafeDeleteModel):
     image_path = models.ImageField(
         upload_to='products', height_field=None,
         width_field=None, max_length=None, null=True)
+    image_thumbnail = models.ImageField(
+        upload_to='products/thumbnails', max_length=255, null=True, blank=True)
+    image_medium = models.ImageField(
+        upload_to='products/medium', max_length=255, null=True, blank=True)
+    image_status = models.CharField(
+        max_length=7, choices=IMAGE_STATUSES, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
 
     @property
     def number_sold(self):
         """number_sold property of a product
 
+        Prefer `Product.objects.with_aggregates()` when serializing many
+        products; this property is the per-row fallback.
+
         Returns:
             int -- Number items on completed orders
         """
+        try:
+            return self.stats.sold_count
+        except ObjectDoesNotExist:
+            pass
+
         sold = OrderProduct.objects.filter(
             product=self, order__payment_type__isnull=False)
-        return sold.count()
+        return sold.aggregate(units=Sum('quantity'))['units'] or 0
 
     @property
     def can_be_rated(self):
@@ -50,13 +104,34 @@ class Product(SafeDeleteModel):
     def can_be_rated(self, value):
         self.__can_be_rated = value
 
+    @property
+    def liked_by_me(self):
+        """liked_by_me property, which will be calculated per user
+
+        Returns:
+            boolean -- If the user has liked the product or not
+        """
+        return self.__liked_by_me
+
+    @liked_by_me.setter
+    def liked_by_me(self, value):
+        self.__liked_by_me = value
+
     @property
     def average_rating(self):
         """Average rating calculated attribute for each product
 
+        Prefer `Product.objects.with_aggregates()` when serializing many
+        products; this property is the per-row fallback.
+
         Returns:
             number -- The average rating for the product
         """
+        try:
+            return self.stats.average_rating
+        except ObjectDoesNotExist:
+            pass
+
         ratings = ProductRating.objects.filter(product=self)
         total_rating = 0
         for rating in ratings:
@@ -74,3 +149,13 @@ class Product(SafeDeleteModel):
     class Meta:
         verbose_name = ("product")
         verbose_name_plural = ("products")
+        indexes = [
+            # One per sortable column, with id as the tiebreaker
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['created_date', 'id'], name='product_created_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+            # Category listings only ever show products that are not deleted
+            models.Index(fields=['category', 'created_date'],
+                         name='product_live_category_idx',
+                         condition=models.Q(deleted__isnull=True)),
+        ]
@@ -4,6 +4,7 @@ from django.db import models
 class ProductCategory(models.Model):
 
     name = models.CharField(max_length=55)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
 
     class Meta:
         verbose_name = ("productcategory")
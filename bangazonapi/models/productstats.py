@@ -0,0 +1,228 @@
+"""Denormalized per-product sales, rating and like counters"""
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, FloatField, Sum, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+from .likeproduct import LikeProduct
+from .orderproduct import OrderProduct
+from .productrating import ProductRating
+
+
+STATS_FIELDS = ('sold_count', 'rating_sum', 'rating_count', 'like_count',
+                'average_rating')
+
+
+def counter_updates(deltas):
+    """UPDATE expressions adding `deltas` to the counters
+
+    `average_rating` is recomputed in the same statement when a rating
+    counter changes. Every SET expression reads the old column values.
+    """
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+
+    if 'rating_sum' in deltas or 'rating_count' in deltas:
+        count_delta = deltas.get('rating_count', 0)
+        rating_sum = F('rating_sum') + deltas.get('rating_sum', 0)
+        rating_count = F('rating_count') + count_delta
+        updates['average_rating'] = Case(
+            When(rating_count__gt=-count_delta,
+                 then=Cast(rating_sum, FloatField()) / Cast(rating_count, FloatField())),
+            default=0.0, output_field=FloatField())
+
+    return updates
+
+
+class ProductStatsManager(models.Manager):
+    """Keeps the stats rows in step with orders, ratings and likes"""
+
+    def increment(self, product_id, **deltas):
+        """Add `deltas` to the counters of a product
+
+        Every product is given a stats row when it is created, and the
+        read paths rely on it. Should a row still be missing, e.g. one
+        deleted from the shell, it is created from the source tables
+        instead, so call this after the write it records and inside the
+        same transaction.
+
+        Arguments:
+            product_id {int} -- Product whose counters change
+            deltas -- Counter name to amount, e.g. `sold_count=2`
+        """
+        updated = self.filter(product_id=product_id).update(
+            updated_at=timezone.now(), **counter_updates(deltas))
+
+        if updated:
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(product_id=product_id,
+                            **self.compute([product_id])[product_id])
+        except IntegrityError:
+            # Another request created the row first, so apply our change to it
+            self.filter(product_id=product_id).update(
+                updated_at=timezone.now(), **counter_updates(deltas))
+
+    def record_sale(self, order):
+        """Count the units on a newly paid order as sold"""
+        sold = OrderProduct.objects.filter(order=order).values_list(
+            'product_id', 'quantity')
+
+        for product_id, quantity in sold:
+            self.increment(product_id, sold_count=quantity)
+
+    def record_rating(self, rating):
+        """Add a new product rating to the rating counters"""
+        self.increment(rating.product_id,
+                       rating_sum=rating.rating, rating_count=1)
+
+    def record_like(self, product_id, delta):
+        """Add (1) or remove (-1) a like"""
+        self.increment(product_id, like_count=delta)
+
+    def compute(self, product_ids=None):
+        """Aggregate the counters from the source tables
+
+        Arguments:
+            product_ids {list} -- Limit to these products (default: all products)
+
+        Returns:
+            dict -- Product id to a dict of counter values
+        """
+        product_model = self.model._meta.get_field('product').related_model
+        products = product_model.all_objects.all()
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+
+        stats = {
+            product_id: dict.fromkeys(STATS_FIELDS, 0)
+            for product_id in products.values_list('id', flat=True)
+        }
+
+        sources = (
+            (OrderProduct.objects.filter(order__payment_type__isnull=False),
+             {'sold_count': Sum('quantity')}),
+            (ProductRating.objects.all(),
+             {'rating_sum': Sum('rating'), 'rating_count': Count('id')}),
+            (LikeProduct.objects.all(),
+             {'like_count': Count('id')}),
+        )
+
+        for queryset, aggregates in sources:
+            if product_ids is not None:
+                queryset = queryset.filter(product_id__in=product_ids)
+
+            rows = queryset.values('product').annotate(**aggregates).order_by()
+            for row in rows:
+                if row['product'] in stats:
+                    for field in aggregates:
+                        stats[row['product']][field] = row[field]
+
+        for counters in stats.values():
+            if counters['rating_count']:
+                counters['average_rating'] = \
+                    counters['rating_sum'] / counters['rating_count']
+
+        return stats
+
+    def create_missing(self, using='default'):
+        """Create the stats rows of products that have none
+
+        Returns:
+            int -- Number of rows created
+        """
+        product_model = self.model._meta.get_field('product').related_model
+        missing = list(product_model.all_objects.using(using).filter(
+            stats__isnull=True).values_list('id', flat=True))
+        if not missing:
+            return 0
+
+        stats = self.compute(missing)
+        self.db_manager(using).bulk_create(
+            [self.model(product_id=product_id, **counters)
+             for product_id, counters in stats.items()],
+            batch_size=500)
+
+        return len(stats)
+
+    def rebuild(self):
+        """Replace every stats row with freshly computed counters
+
+        Returns:
+            int -- Number of rows written
+        """
+        with transaction.atomic():
+            stats = self.compute()
+            self.all().delete()
+            self.bulk_create(
+                [self.model(product_id=product_id, **counters)
+                 for product_id, counters in stats.items()],
+                batch_size=500)
+
+        return len(stats)
+
+    def drift(self):
+        """Compare the stored counters against the source tables
+
+        Returns:
+            list -- (product_id, field, stored, expected) for every mismatch,
+                    with `stored` None when the product has no stats row
+        """
+        expected = self.compute()
+        stored = {
+            row['product_id']: row
+            for row in self.values('product_id', *STATS_FIELDS)
+        }
+
+        mismatches = []
+        for product_id, counters in sorted(expected.items()):
+            row = stored.get(product_id)
+            for field in STATS_FIELDS:
+                value = row[field] if row is not None else None
+                if value != counters[field]:
+                    mismatches.append(
+                        (product_id, field, value, counters[field]))
+
+        return mismatches
+
+
+class ProductStats(models.Model):
+
+    product = models.OneToOneField(
+        "Product", on_delete=models.CASCADE,
+        primary_key=True, related_name="stats")
+    sold_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    like_count = models.IntegerField(default=0)
+    # rating_sum / rating_count, stored so products can be sorted on it
+    average_rating = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductStatsManager()
+
+    class Meta:
+        verbose_name = ("productstats")
+        verbose_name_plural = ("productstats")
+        indexes = [
+            models.Index(fields=['sold_count', 'product'],
+                         name='productstats_sold_idx'),
+            models.Index(fields=['average_rating', 'product'],
+                         name='productstats_rating_idx'),
+        ]
+
+
+def create_product_stats(sender, instance, created=False, **kwargs):
+    """post_save handler for products; every product gets a stats row
+
+    Sorting and filtering on the counters join the stats rows with an
+    inner join, so a product without one would drop out of those lists.
+    The row may already exist when loaddata loaded it first.
+    """
+    if created:
+        ProductStats.objects.get_or_create(product_id=instance.pk)
+
+
+def backfill_product_stats(sender, using='default', **kwargs):
+    """post_migrate handler creating the stats rows products are missing"""
+    ProductStats.objects.create_missing(using)
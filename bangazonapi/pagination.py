@@ -0,0 +1,191 @@
+"""Pagination for the hand-written ViewSet list() methods"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class OptionalLimitOffsetPagination(LimitOffsetPagination):
+    """Limit/offset pagination that is only applied when it is asked for
+
+    Requests without `limit` or `offset` keep receiving a plain JSON
+    array, so existing clients are unaffected.
+    """
+    max_limit = 100
+
+    def get_limit(self, request):
+        if self.limit_query_param not in request.query_params \
+                and self.offset_query_param not in request.query_params:
+            return None
+        return super().get_limit(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Check the limit before LimitOffsetPagination runs its COUNT(*)
+        if self.get_limit(request) is None:
+            return None
+
+        if not queryset.ordered:
+            queryset = queryset.order_by('id')
+
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a (key, id) pair
+
+    Each page is fetched with a `(key, id) > (last key, last id)`
+    predicate instead of an OFFSET, so a deep page costs the same as the
+    first one and no COUNT(*) is needed. The cursor is an opaque token
+    holding the key and id of the last row of the previous page; pass an
+    empty `cursor` to get the first page.
+
+    `tiebreaker` is the field path used for the id part, for keys on a
+    joined table whose index ends with that table's copy of the id.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    max_limit = 100
+
+    def __init__(self, key='id', descending=False, tiebreaker='id'):
+        self.key = key
+        self.descending = descending
+        self.tiebreaker = tiebreaker
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+
+        fields = (self.key, self.tiebreaker) if self.key != 'id' else ('id',)
+        queryset = queryset.order_by(
+            *[f'-{field}' if self.descending else field for field in fields])
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.position_filter(*position))
+
+        # Fetch one extra row to find out if there is a next page
+        rows = list(queryset[:self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        self.page = rows[:self.limit]
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if limit <= 0:
+            return self.page_size
+
+        return min(limit, self.max_limit)
+
+    def position_filter(self, value, pk):
+        """Build the predicate selecting the rows after (value, pk)
+
+        Arguments:
+            value -- Key of the last row on the previous page
+            pk {int} -- Id of the last row on the previous page
+
+        Returns:
+            Q -- The keyset predicate
+        """
+        lookup = 'lt' if self.descending else 'gt'
+
+        if self.key == 'id':
+            return Q(**{f'id__{lookup}': pk})
+
+        return Q(**{f'{self.key}__{lookup}': value}) | \
+            Q(**{self.key: value, f'{self.tiebreaker}__{lookup}': pk})
+
+    def decode_cursor(self, request):
+        """Read the (value, pk) position out of the `cursor` query param"""
+        encoded = request.query_params.get(self.cursor_query_param, '')
+        if not encoded:
+            return None
+
+        try:
+            value, pk = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            return value, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+
+    def encode_cursor(self, row):
+        """Build the cursor token pointing just after `row`, a model or a dict"""
+        if isinstance(row, dict):
+            position = [row[self.key], row['id']]
+        else:
+            position = [getattr(row, self.key), row.id]
+        return urlsafe_b64encode(
+            json.dumps(position, default=str).encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+
+class PaginatedViewSetMixin:
+    """DRF style pagination hooks for ViewSets with hand-written list() methods
+
+    Sending `cursor` switches to keyset pagination on one of the view's
+    `keyset_keys`, picked with the `order_by` and `direction` query
+    params and defaulting to the first key. Sending `limit` or `offset`
+    uses the configured limit/offset pagination. Otherwise the list is
+    not paginated.
+    """
+    keyset_keys = ('id',)
+
+    def get_keyset(self, key):
+        """The (field, tiebreaker) paths to paginate on for a keyset key"""
+        return key, 'id'
+
+    @property
+    def paginator(self):
+        """The paginator instance for the current request, or `None`"""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+
+            if KeysetPagination.cursor_query_param in params:
+                key = params.get('order_by', None)
+                if key not in self.keyset_keys:
+                    key = self.keyset_keys[0]
+
+                field, tiebreaker = self.get_keyset(key)
+                self._paginator = KeysetPagination(
+                    field, descending=params.get('direction', None) == 'desc',
+                    tiebreaker=tiebreaker)
+
+            elif api_settings.DEFAULT_PAGINATION_CLASS is not None:
+                self._paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+
+            else:
+                self._paginator = None
+
+        return self._paginator
+
+    def paginate_queryset(self, queryset):
+        """A page of results, or `None` if the request is not paginated"""
+        if self.paginator is None:
+            return None
+        return self.paginator.paginate_queryset(queryset, self.request, view=self)
+
+    def get_paginated_response(self, data):
+        """The paginated `Response` for the serialized page"""
+        return self.paginator.get_paginated_response(data)
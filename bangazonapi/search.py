@@ -0,0 +1,143 @@
+"""Full-text product search backed by an SQLite FTS5 table
+
+The `bangazonapi_product_fts` virtual table indexes the name, description
+and location of every product that is not soft-deleted, using the product
+id as its rowid. It is created after migrations run and kept in sync by
+the Product save/delete signal handlers below.
+"""
+import re
+from django.db import connections
+
+
+FTS_TABLE = 'bangazonapi_product_fts'
+
+
+def search_enabled(connection):
+    """FTS5 is only available on SQLite"""
+    return connection.vendor == 'sqlite'
+
+
+def create_search_index(sender, using='default', **kwargs):
+    """post_migrate handler that creates and fills the FTS5 table"""
+    connection = connections[using]
+    if not search_enabled(connection):
+        return
+
+    with connection.cursor() as cursor:
+        if FTS_TABLE in connection.introspection.table_names(cursor):
+            return
+
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+                name, description, location,
+                tokenize = 'unicode61',
+                prefix = '2 3'
+            )
+        """)
+
+    rebuild_search_index(using)
+
+
+def rebuild_search_index(using='default'):
+    """Re-index every product that is not soft-deleted"""
+    connection = connections[using]
+    if not search_enabled(connection):
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"""
+            INSERT INTO {FTS_TABLE} (rowid, name, description, location)
+            SELECT id, name, description, location
+            FROM bangazonapi_product
+            WHERE deleted IS NULL
+        """)
+
+
+def index_products(products, using='default'):
+    """Add, refresh or remove many products in a couple of statements
+
+    Used for bulk writes, which do not send the post_save signal.
+
+    Arguments:
+        products {list} -- Saved Product instances
+    """
+    connection = connections[using]
+    if not search_enabled(connection) or not products:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+            [[product.id] for product in products])
+
+        cursor.executemany(
+            f"""INSERT INTO {FTS_TABLE} (rowid, name, description, location)
+            VALUES (%s, %s, %s, %s)""",
+            [[product.id, product.name, product.description, product.location]
+             for product in products if product.deleted is None])
+
+
+def index_product(sender, instance, using='default', **kwargs):
+    """post_save handler that adds, refreshes or removes a product"""
+    index_products([instance], using)
+
+
+def unindex_product(sender, instance, using='default', **kwargs):
+    """post_delete handler for hard-deleted products"""
+    connection = connections[using]
+    if not search_enabled(connection):
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [instance.id])
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 MATCH expression
+
+    Every word is quoted, so FTS5 operators in the input are searched for
+    literally, and gets a `*` for prefix matching. Words are ANDed.
+
+    Arguments:
+        query {str} -- Search text from the client
+
+    Returns:
+        str -- The MATCH expression, or None when there are no words
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_products(products, query):
+    """Restrict a product queryset to full-text matches, best match first
+
+    The FTS table is joined to the queryset, so the search composes with
+    any other filters, annotations and slicing already applied.
+
+    Arguments:
+        products {ProductQuerySet} -- Products to search within
+        query {str} -- Search text from the client
+
+    Returns:
+        ProductQuerySet -- Matching products ordered by BM25 rank
+    """
+    match = match_expression(query)
+    if match is None:
+        return products.none()
+
+    if not search_enabled(connections[products.db]):
+        return products.filter(name__icontains=query)
+
+    return products.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = bangazonapi_product.id',
+               f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+        select={'search_rank': f'{FTS_TABLE}.rank'},
+        order_by=['search_rank', 'id'],
+    )
@@ -0,0 +1,15 @@
+"""SQLite connection settings for concurrent requests"""
+
+
+def use_wal(sender, connection, **kwargs):
+    """connection_created handler switching SQLite to write-ahead logging
+
+    In WAL mode readers neither block the writer nor wait for it, so
+    concurrent checkouts only queue behind each other's writes. The mode
+    is stored in the database file; in-memory databases ignore it.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
@@ -1,11 +1,105 @@
 """View module for handling requests about customer shopping cart"""
-import datetime
+from django.db import transaction
 from rest_framework.viewsets import ViewSet
+from bangazonapi.conditional import conditional
 from rest_framework.response import Response
 from rest_framework import status
-from bangazonapi.models import Order, Customer, Product, OrderProduct
-from .product import ProductSerializer
-from .order import OrderSerializer
+from bangazonapi.fieldsets import expands, wants
+from bangazonapi.models import Order, Product, OrderProduct
+from .product import ProductRowSerializer, overlay_customer_flags
+from .order import OrderSerializer, order_validators
+
+
+def cart_validators(view, request):
+    """Conditional GET validators for the customer's open order"""
+    return order_validators(Order.objects.filter(
+        customer=request.customer, payment_type=None))
+
+
+class CartOrderSerializer(OrderSerializer):
+    """The open order without its line items, which serialize_cart() adds"""
+    lineitems = None
+
+    class Meta(OrderSerializer.Meta):
+        fields = ('id', 'url', 'created_date', 'payment_type', 'customer')
+
+
+def serialize_cart(request, with_products=True):
+    """Serialize the customer's open order in a fixed number of queries
+
+    The order, its line items and their products are read in one query
+    each, and every distinct product is serialized once. Line items nest
+    the full product like `OrderSerializer` does, next to their quantity.
+    With `with_products`, `products` lists the products of the line items
+    that are not soft-deleted, honoring `?fields=` and `?expand=category`
+    and with the customer flags, and `size` counts their units; otherwise
+    `size` counts the units of every line item.
+
+    Arguments:
+        request {Request} -- The current request
+        with_products {bool} -- Add the top-level `products` list
+
+    Returns:
+        dict -- The cart body
+
+    Raises:
+        Order.DoesNotExist -- When the customer has no open order
+    """
+    related = [
+        field for field in ('payment_type', 'customer') if expands(request, field)]
+    open_order = Order.objects.select_related(*related).get(
+        customer=request.customer, payment_type=None)
+
+    cart = CartOrderSerializer(open_order, context={'request': request}).data
+
+    # The (order, product) unique index returns the lines in product order
+    line_items = list(OrderProduct.objects.filter(order=open_order).order_by(
+        'product_id').values_list('id', 'product_id', 'quantity'))
+
+    if not (with_products or wants(request, 'lineitems')):
+        cart['size'] = sum(quantity for _, _, quantity in line_items)
+        return cart
+
+    nested = ProductRowSerializer(request, nested=True)
+    top = ProductRowSerializer(request)
+
+    extra = ['deleted']
+    if with_products and top.expand_category:
+        extra += ['category_id', 'category__name']
+    rows = {
+        row['id']: row for row in nested.values(Product.all_objects.filter(
+            pk__in={product_id for _, product_id, _ in line_items}).with_aggregates(), *extra)
+    }
+    products = dict(zip(rows, nested.to_representation(rows.values())))
+
+    if wants(request, 'lineitems'):
+        cart['lineitems'] = [
+            {'id': line_item_id, 'quantity': quantity, 'product': products[product_id]}
+            for line_item_id, product_id, quantity in line_items
+        ]
+
+    if not with_products:
+        cart['size'] = sum(quantity for _, _, quantity in line_items)
+        return cart
+
+    size = 0
+    product_list = []
+    for _, product_id, quantity in line_items:
+        if rows[product_id]['deleted'] is not None:
+            continue
+
+        size += quantity
+
+        product = {field: products[product_id][field] for field in top.fields}
+        if top.expand_category:
+            product['category'] = top.category(rows[product_id])
+        product_list.append(product)
+
+    overlay_customer_flags(product_list, request)
+
+    cart['products'] = product_list
+    cart['size'] = size
+    return cart
 
 
 class Cart(ViewSet):
@@ -21,21 +115,10 @@ class Cart(ViewSet):
             HTTP/1.1 204 No Content
         @apiParam {Number} product_id Id of product to add
         """
-        current_user = Customer.objects.get(user=request.auth.user)
-
-        try:
-            open_order = Order.objects.get(
-                customer=current_user, payment_type__isnull=True)
-        except Order.DoesNotExist as ex:
-            open_order = Order()
-            open_order.created_date = datetime.datetime.now()
-            open_order.customer = current_user
-            open_order.save()
+        open_order, _ = Order.objects.get_or_create_open(request.customer)
 
-        line_item = OrderProduct()
-        line_item.product = Product.objects.get(pk=request.data["product_id"])
-        line_item.order = open_order
-        line_item.save()
+        product = Product.objects.get(pk=request.data["product_id"])
+        OrderProduct.objects.change_quantity(open_order, product.id, 1)
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
@@ -50,19 +133,104 @@ class Cart(ViewSet):
         @apiSuccessExample {json} Success
             HTTP/1.1 204 No Content
         """
-        current_user = Customer.objects.get(user=request.auth.user)
+        current_user = request.customer
         open_order = Order.objects.get(
             customer=current_user, payment_type=None)
 
-        line_item = OrderProduct.objects.filter(
-            product__id=pk,
-            order=open_order
-        )[0]
-        line_item.delete()
+        if not OrderProduct.objects.filter(product_id=pk, order=open_order).exists():
+            return Response(
+                {'message': 'That product is not in the cart.'},
+                status=status.HTTP_404_NOT_FOUND)
+
+        OrderProduct.objects.change_quantity(open_order, pk, -1)
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
+    def change_quantities(self, request):
+        """
+        @api {PATCH} /cart PATCH quantities of several products in cart
+        @apiName ChangeQuantities
+        @apiGroup ShoppingCart
+
+        @apiHeader {String} Authorization Auth token
+        @apiHeaderExample {String} Authorization
+            Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+        @apiParam {Object[]} body Changes to apply, all or none
+        @apiParam {Number} body.product_id Id of product to change
+        @apiParam {Number} body.delta Units to add, or to remove when negative
+        @apiParamExample {json} Input
+            [
+                {"product_id": 52, "delta": 2},
+                {"product_id": 7, "delta": -1}
+            ]
+
+        @apiSuccess (200) {Object} cart The cart after the changes, as GET /cart
+        @apiError (400) {Object[]} errors Errors of every invalid change. Nothing is
+            written when any change is invalid.
+        @apiErrorExample {json} Error
+            {
+                "errors": [
+                    {
+                        "index": 1,
+                        "message": "Product matching query does not exist."
+                    }
+                ]
+            }
+        @apiError (404) {String} message  Not found message
+        """
+        changes = request.data
+        if not isinstance(changes, list) or not changes:
+            return Response(
+                {'message': 'Send a non-empty array of product_id and delta changes.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        errors = []
+        product_ids = {}
+        deltas = {}
+        for index, change in enumerate(changes):
+            try:
+                product_id = int(change['product_id'])
+                delta = int(change['delta'])
+            except (KeyError, TypeError, ValueError):
+                errors.append({'index': index, 'message': 'Each change needs an integer product_id and delta.'})
+                continue
 
+            product_ids[index] = product_id
+            # Several changes to one product are applied as their sum
+            deltas[product_id] = deltas.get(product_id, 0) + delta
+
+        # A soft-deleted product can still be taken out of the cart
+        found = Product.all_objects.filter(pk__in=deltas).values_list('id', 'deleted')
+        missing = set(deltas) - {
+            product_id for product_id, deleted in found
+            if deleted is None or deltas[product_id] < 0
+        }
+        errors += [
+            {'index': index, 'message': 'Product matching query does not exist.'}
+            for index, product_id in product_ids.items() if product_id in missing
+        ]
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if any(delta > 0 for delta in deltas.values()):
+                open_order, _ = Order.objects.get_or_create_open(request.customer)
+            else:
+                try:
+                    open_order = Order.objects.get(
+                        customer=request.customer, payment_type=None)
+                except Order.DoesNotExist as ex:
+                    return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+
+            for product_id, delta in deltas.items():
+                if delta:
+                    OrderProduct.objects.change_quantity(open_order, product_id, delta)
+
+        return Response(serialize_cart(request))
+
+
+    @conditional(cart_validators, last_modified=False)
     def list(self, request):
         """
         @api {GET} /cart GET line items in cart
@@ -77,6 +245,7 @@ class Cart(ViewSet):
         @apiSuccess (200) {Number} size Number of items in cart
         @apiSuccess (200) {Object[]} line_items Line items in cart
         @apiSuccess (200) {Number} line_items.id Line item id
+        @apiSuccess (200) {Number} line_items.quantity Units of the product in cart
         @apiSuccess (200) {Object} line_items.product Product in cart
         @apiSuccessExample {json} Success
             {
@@ -107,27 +276,9 @@ class Cart(ViewSet):
                 "size": 1
             }
         """
-        current_user = Customer.objects.get(user=request.auth.user)
         try:
-            open_order = Order.objects.get(
-                customer=current_user, payment_type=None)
-
-            products_on_order = Product.objects.filter(
-                lineitems__order=open_order)
-
-            serialized_order = OrderSerializer(
-                open_order, many=False, context={'request': request})
-
-            product_list = ProductSerializer(
-                products_on_order, many=True, context={'request': request})
-
-            final = {
-                "order": serialized_order.data
-            }
-            final["order"]["products"] = product_list.data
-            final["order"]["size"] = len(products_on_order)
-
+            cart = serialize_cart(request)
         except Order.DoesNotExist as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response(final["order"])
+        return Response(cart)
@@ -3,6 +3,7 @@ from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
+from bangazonapi.authentication import get_full_customer
 from bangazonapi.models import Customer
 
 
@@ -33,7 +34,9 @@ class Customers(ViewSet):
         @apiSuccessExample {json} Success
             HTTP/1.1 204 No Content
         """
-        customer = Customer.objects.get(user=request.auth.user)
+        # A customer from the token cache only has its ids loaded, and
+        # save() would then skip every other field, updated_at included
+        customer = get_full_customer(request)
         customer.user.last_name = request.data["last_name"]
         customer.user.email = request.data["email"]
         customer.address = request.data["address"]
@@ -5,7 +5,7 @@ from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
-from bangazonapi.models import OrderProduct, Order, Product, Customer
+from bangazonapi.models import OrderProduct, Order, Product
 
 
 class LineItemSerializer(serializers.HyperlinkedModelSerializer):
@@ -16,7 +16,7 @@ class LineItemSerializer(serializers.HyperlinkedModelSerializer):
             view_name='lineitem',
             lookup_field='id'
         )
-        fields = ('id', 'url', 'order', 'product')
+        fields = ('id', 'url', 'order', 'product', 'quantity', 'unit_price')
 
 
 class LineItems(ViewSet):
@@ -50,7 +50,7 @@ class LineItems(ViewSet):
             HTTP/1.1 200 OK
         """
         try:
-            customer = Customer.objects.get(user=request.auth.user)
+            customer = request.customer
             line_item = OrderProduct.objects.get(
                 pk=pk, order__customer=customer)
 
@@ -77,7 +77,7 @@ class LineItems(ViewSet):
             HTTP/1.1 204 No Content
         """
         try:
-            customer = Customer.objects.get(user=request.auth.user)
+            customer = request.customer
             order_product = OrderProduct.objects.get(
                 pk=pk, order__customer=customer)
 
@@ -1,5 +1,6 @@
 """View module for handling requests about customer order"""
 import datetime
+from django.db.models import Count, Max, Prefetch
 from django.http import HttpResponseServerError
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
@@ -7,9 +8,64 @@ from rest_framework import serializers
 from rest_framework import status
 from rest_framework.decorators import action
 from bangazonapi.models import Order, Payment, Customer, Product, OrderProduct
+from bangazonapi.models.order import OutOfStock
+from bangazonapi.conditional import conditional
+from bangazonapi.fieldsets import SparseFieldsetMixin, expands, wants
+from bangazonapi.pagination import PaginatedViewSetMixin
+from .paymenttype import PaymentSerializer
 from .product import ProductSerializer
 
 
+def with_line_items(orders):
+    """Prefetch line items and their products for a queryset of orders
+
+    Products are loaded with their sales and rating aggregates so that
+    serializing an order takes a fixed number of queries.
+
+    Arguments:
+        orders {QuerySet} -- Orders to be serialized
+
+    Returns:
+        QuerySet -- The orders with line items and products prefetched
+    """
+    return orders.prefetch_related(
+        'lineitems',
+        Prefetch('lineitems__product',
+                 queryset=Product.all_objects.with_aggregates()),
+    )
+
+
+def order_validators(orders):
+    """Conditional GET validators for orders and everything they nest
+
+    Arguments:
+        orders {QuerySet} -- Orders behind the response
+
+    Returns:
+        dict -- Row counts and the newest `updated_at` of each table
+    """
+    return orders.aggregate(
+        count=Count('id', distinct=True),
+        lineitems=Count('lineitems'),
+        order=Max('updated_at'),
+        lineitem=Max('lineitems__updated_at'),
+        product=Max('lineitems__product__updated_at'),
+        stats=Max('lineitems__product__stats__updated_at'),
+    )
+
+
+def order_list_validators(view, request):
+    """Conditional GET validators for the customer's orders"""
+    return order_validators(
+        Order.objects.filter(customer=request.customer))
+
+
+def order_detail_validators(view, request, pk=None):
+    """Conditional GET validators for one of the customer's orders"""
+    return order_validators(
+        Order.objects.filter(pk=pk, customer=request.customer))
+
+
 class OrderLineItemSerializer(serializers.HyperlinkedModelSerializer):
     """JSON serializer for line items """
 
@@ -21,14 +77,30 @@ class OrderLineItemSerializer(serializers.HyperlinkedModelSerializer):
             view_name='lineitem',
             lookup_field='id'
         )
-        fields = ('id', 'product')
+        fields = ('id', 'quantity', 'unit_price', 'product')
         depth = 1
 
 
-class OrderSerializer(serializers.HyperlinkedModelSerializer):
-    """JSON serializer for customer orders"""
+class OrderCustomerSerializer(serializers.HyperlinkedModelSerializer):
+    """JSON serializer for the customer of an expanded order"""
+
+    class Meta:
+        model = Customer
+        fields = ('id', 'url', 'phone_number', 'address')
+
+
+class OrderSerializer(SparseFieldsetMixin, serializers.HyperlinkedModelSerializer):
+    """JSON serializer for customer orders
+
+    `?expand=payment_type` and `?expand=customer` replace those URIs with
+    the related objects.
+    """
 
     lineitems = OrderLineItemSerializer(many=True)
+    expandable_fields = {
+        'payment_type': lambda: PaymentSerializer(read_only=True),
+        'customer': lambda: OrderCustomerSerializer(read_only=True),
+    }
 
     class Meta:
         model = Order
@@ -36,13 +108,31 @@ class OrderSerializer(serializers.HyperlinkedModelSerializer):
             view_name='order',
             lookup_field='id'
         )
-        fields = ('id', 'url', 'created_date',
-                  'payment_type', 'customer', 'lineitems')
+        fields = ('id', 'url', 'created_date', 'payment_type', 'customer',
+                  'subtotal', 'item_count', 'lineitems')
 
 
-class Orders(ViewSet):
+class Orders(PaginatedViewSetMixin, ViewSet):
     """View for interacting with customer orders"""
+    keyset_keys = ('created_date',)
+
+    def order_queryset(self):
+        """Orders with only the related rows that the requested fields need"""
+        orders = Order.objects.all()
 
+        if wants(self.request, 'lineitems'):
+            orders = with_line_items(orders)
+
+        related = [
+            field for field in ('payment_type', 'customer')
+            if expands(self.request, field)
+        ]
+        if related:
+            orders = orders.select_related(*related)
+
+        return orders
+
+    @conditional(order_detail_validators, last_modified=False)
     def retrieve(self, request, pk=None):
         """
         @api {GET} /cart/:id GET single order
@@ -53,12 +143,16 @@ class Orders(ViewSet):
         @apiHeaderExample {String} Authorization
             Token 9ba45f09651c5b0c404f37a2d2572c026c146611
 
+        @apiParam {String} [fields] Comma separated fields to return, e.g. `id,created_date`
+        @apiParam {String} [expand] `payment_type` and/or `customer` to nest those objects
 
         @apiSuccess (200) {id} id Order id
         @apiSuccess (200) {String} url Order URI
         @apiSuccess (200) {String} created_date Date order was created
         @apiSuccess (200) {String} payment_type Payment URI
         @apiSuccess (200) {String} customer Customer URI
+        @apiSuccess (200) {Number} subtotal Amount paid, null while the order is open
+        @apiSuccess (200) {Number} item_count Units paid for, null while the order is open
 
         @apiSuccessExample {json} Success
             {
@@ -66,12 +160,14 @@ class Orders(ViewSet):
                 "url": "http://localhost:8000/orders/1",
                 "created_date": "2019-08-16",
                 "payment_type": "http://localhost:8000/paymenttypes/1",
-                "customer": "http://localhost:8000/customers/5"
+                "customer": "http://localhost:8000/customers/5",
+                "subtotal": 29.98,
+                "item_count": 2
             }
         """
         try:
-            customer = Customer.objects.get(user=request.auth.user)
-            order = Order.objects.get(pk=pk, customer=customer)
+            customer = request.customer
+            order = self.order_queryset().get(pk=pk, customer=customer)
             serializer = OrderSerializer(order, context={'request': request})
             return Response(serializer.data)
 
@@ -103,15 +199,43 @@ class Orders(ViewSet):
 
         @apiSuccessExample {json} Success
             HTTP/1.1 204 No Content
+        @apiError (409) {Object[]} out_of_stock Line items with more units than
+            are in stock. Nothing is written, and the order stays open.
+        @apiErrorExample {json} Error
+            {
+                "message": "Some items are out of stock.",
+                "out_of_stock": [
+                    {
+                        "product_id": 52,
+                        "requested": 3,
+                        "available": 1
+                    }
+                ]
+            }
         """
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
+
+        # Read before checkout() starts its transaction, which must write first
         order = Order.objects.get(pk=pk, customer=customer)
-        order.payment_type = Payment.objects.get(
-            pk=request.data["payment_type"])
-        order.save()
+        payment = Payment.objects.get(pk=request.data["payment_type"])
+
+        try:
+            paid = order.payment_type_id is None and Order.objects.checkout(order, payment)
+        except OutOfStock as ex:
+            return Response(
+                {"message": "Some items are out of stock.", "out_of_stock": ex.items},
+                status=status.HTTP_409_CONFLICT)
+
+        if not paid:
+            # An already paid order only changes its payment type. The
+            # instance may predate a concurrent checkout, so write nothing
+            # else over that checkout's totals.
+            order.payment_type = payment
+            order.save(update_fields=['payment_type', 'updated_at'])
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
+    @conditional(order_list_validators, last_modified=False)
     def list(self, request):
         """
         @api {GET} /orders GET customer orders
@@ -123,6 +247,8 @@ class Orders(ViewSet):
             Token 9ba45f09651c5b0c404f37a2d2572c026c146611
 
         @apiParam {id} payment_id Query param to filter by payment used
+        @apiParam {String} [fields] Comma separated fields to return, e.g. `id,created_date`
+        @apiParam {String} [expand] `payment_type` and/or `customer` to nest those objects
 
         @apiSuccess (200) {Object[]} orders Array of order objects
         @apiSuccess (200) {id} orders.id Order id
@@ -130,6 +256,8 @@ class Orders(ViewSet):
         @apiSuccess (200) {String} orders.created_date Date order was created
         @apiSuccess (200) {String} orders.payment_type Payment URI
         @apiSuccess (200) {String} orders.customer Customer URI
+        @apiSuccess (200) {Number} orders.subtotal Amount paid, null while the order is open
+        @apiSuccess (200) {Number} orders.item_count Units paid for, null while the order is open
 
         @apiSuccessExample {json} Success
             [
@@ -138,17 +266,25 @@ class Orders(ViewSet):
                     "url": "http://localhost:8000/orders/1",
                     "created_date": "2019-08-16",
                     "payment_type": "http://localhost:8000/paymenttypes/1",
-                    "customer": "http://localhost:8000/customers/5"
+                    "customer": "http://localhost:8000/customers/5",
+                    "subtotal": 29.98,
+                    "item_count": 2
                 }
             ]
         """
-        customer = Customer.objects.get(user=request.auth.user)
-        orders = Order.objects.filter(customer=customer)
+        customer = request.customer
+        orders = self.order_queryset().filter(customer=customer)
 
         payment = self.request.query_params.get('payment_id', None)
         if payment is not None:
             orders = orders.filter(payment__id=payment)
 
+        page = self.paginate_queryset(orders)
+        if page is not None:
+            json_orders = OrderSerializer(
+                page, many=True, context={'request': request})
+            return self.get_paginated_response(json_orders.data)
+
         json_orders = OrderSerializer(
             orders, many=True, context={'request': request})
 
@@ -4,7 +4,8 @@ from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
-from bangazonapi.models import Payment, Customer
+from bangazonapi.models import Payment
+from bangazonapi.pagination import PaginatedViewSetMixin
 
 
 class PaymentSerializer(serializers.HyperlinkedModelSerializer):
@@ -23,7 +24,8 @@ class PaymentSerializer(serializers.HyperlinkedModelSerializer):
                   'expiration_date', 'create_date')
 
 
-class Payments(ViewSet):
+class Payments(PaginatedViewSetMixin, ViewSet):
+    keyset_keys = ('create_date',)
 
     def create(self, request):
         """Handle POST operations
@@ -36,7 +38,7 @@ class Payments(ViewSet):
         new_payment.account_number = request.data["account_number"]
         new_payment.expiration_date = request.data["expiration_date"]
         new_payment.create_date = request.data["create_date"]
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         new_payment.customer = customer
         new_payment.save()
 
@@ -93,10 +95,16 @@ class Payments(ViewSet):
         if customer_id is not None:
             # payment_types = payment_types.filter(customer__id=customer_id)
             payment_types = payment_types.filter(
-                customer__user=request.auth.user)
+                customer=request.customer)
         else:
             payment_types = payment_types.filter(
-                customer__user=request.auth.user)
+                customer=request.customer)
+
+        page = self.paginate_queryset(payment_types)
+        if page is not None:
+            serializer = PaymentSerializer(
+                page, many=True, context={'request': request})
+            return self.get_paginated_response(serializer.data)
 
         serializer = PaymentSerializer(
             payment_types, many=True, context={'request': request})
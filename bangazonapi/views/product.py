@@ -1,32 +1,338 @@
 """View module for handling requests about products"""
-import base64
+import json
+from operator import itemgetter
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
-from django.db import IntegrityError
-from django.http import HttpResponseServerError
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, IntegerField, Max, Q, Value, When
+from django.http import HttpResponseServerError, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework.decorators import action
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework import serializers
 from rest_framework import status
-from bangazonapi.models import Product, Customer, ProductCategory, LikeProduct, ProductRating
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.utils.encoders import JSONEncoder
+from bangazonapi.models import Product, ProductCategory, LikeProduct, ProductRating, ProductStats
+from bangazonapi.cache import bump_version_on_commit, cache_stats, cached_response
+from bangazonapi.conditional import conditional
+from bangazonapi.fieldsets import SparseFieldsetMixin, expands, param_names, wants
+from bangazonapi.images import IMAGE_FORMATS, ImageSizeLimitHandler, schedule_product_image, sniff_image_format
+from bangazonapi.pagination import KeysetPagination, PaginatedViewSetMixin
+from bangazonapi.search import index_products, search_products
+from rest_framework.permissions import IsAdminUser, IsAuthenticatedOrReadOnly
 from rest_framework.parsers import MultiPartParser, FormParser
+from .productcategory import ProductCategorySerializer
 
 
-class ProductSerializer(serializers.ModelSerializer):
-    """JSON serializer for products"""
+BULK_MAX_PRODUCTS = 10000
+BULK_BATCH_SIZE = 500
+
+# Lower bounds of the price buckets counted by GET /products/facets
+PRICE_BUCKETS = (0, 25, 50, 100, 250, 500, 1000, 5000)
+FACET_MAX_LOCATIONS = 20
+
+# Columns of values() rows behind the computed ProductSerializer fields
+ROW_COLUMNS = {
+    'number_sold': 'sold_count',
+    'average_rating': 'rating_average',
+}
+
+# Sortable keys for GET /products: the field to order on and its tiebreaker.
+# Each pair is covered by an index. The computed keys are the
+# with_aggregates() annotations, which read the indexed ProductStats columns.
+PRODUCT_ORDERINGS = {
+    'created_date': ('created_date', 'id'),
+    'price': ('price', 'id'),
+    'name': ('name', 'id'),
+    'number_sold': ('sold_count', 'stats__product_id'),
+    'average_rating': ('rating_average', 'stats__product_id'),
+}
+
+
+def parse_id(value):
+    """A primary key from request data, or None when it is not an integer"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def row_ids(rows, key):
+    """The distinct valid ids under `key` in a list of request rows"""
+    ids = {parse_id(row.get(key)) for row in rows if isinstance(row, dict)}
+    ids.discard(None)
+    return list(ids)
+
+
+def customer_flag_sets(product_ids, request):
+    """Find which of the products the current customer has rated and liked
+
+    Uses one set-membership query per flag for the whole collection.
+
+    Arguments:
+        product_ids {list} -- Ids of the products being serialized
+        request {Request} -- The current request
+
+    Returns:
+        tuple -- (rated ids, liked ids), or None for unauthenticated requests
+    """
+    if request is None or request.customer is None or not product_ids:
+        return None
+
+    rated = set(ProductRating.objects.filter(
+        customer=request.customer, product_id__in=product_ids
+    ).values_list('product_id', flat=True))
+
+    liked = set(LikeProduct.objects.filter(
+        customer=request.customer, product_id__in=product_ids
+    ).values_list('product_id', flat=True))
+
+    return rated, liked
+
+
+def set_customer_flags(products, request):
+    """Set `can_be_rated` and `liked_by_me` on products for the current customer
+
+    Nothing is set for unauthenticated requests, so the serializer leaves
+    the fields out.
+
+    Arguments:
+        products {list} -- Product instances about to be serialized
+        request {Request} -- The current request
+    """
+    flags = customer_flag_sets([product.id for product in products], request)
+    if flags is None:
+        return
+
+    rated, liked = flags
+    for product in products:
+        product.can_be_rated = product.id not in rated
+        product.liked_by_me = product.id in liked
+
+
+def overlay_customer_flags(rows, request):
+    """Add `can_be_rated` and `liked_by_me` to already serialized products
+
+    Used on bodies from the shared response cache, which are built
+    without the per-customer fields. Fields left out by `?fields=` are
+    not added.
+
+    Arguments:
+        rows {list} -- Serialized products
+        request {Request} -- The current request
+    """
+    add_rated = wants(request, 'can_be_rated')
+    add_liked = wants(request, 'liked_by_me')
+    if not (add_rated or add_liked):
+        return
+
+    flags = customer_flag_sets([row['id'] for row in rows], request)
+    if flags is None:
+        return
+
+    rated, liked = flags
+    for row in rows:
+        if add_rated:
+            row['can_be_rated'] = row['id'] not in rated
+        if add_liked:
+            row['liked_by_me'] = row['id'] in liked
+
+
+class ProductListSerializer(serializers.ListSerializer):
+    """Serializes a collection of products with the per-customer flags"""
+
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, 'all') else data)
+        if self.context.get('customer_flags', True) and (
+                self.child.field_requested('can_be_rated') or
+                self.child.field_requested('liked_by_me')):
+            set_customer_flags(products, self.context.get('request'))
+        return super().to_representation(products)
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """JSON serializer for products
+
+    `number_sold` and `average_rating` are read from the annotations added
+    by `Product.objects.with_aggregates()` when present, otherwise from the
+    model properties. `?expand=category` adds the product category.
+    """
+    number_sold = serializers.SerializerMethodField()
+    average_rating = serializers.SerializerMethodField()
+    expandable_fields = {
+        'category': lambda: ProductCategorySerializer(read_only=True),
+    }
+
     class Meta:
         model = Product
         fields = ('id', 'name', 'price', 'number_sold', 'description',
                   'quantity', 'created_date', 'location', 'image_path',
-                  'average_rating', 'can_be_rated', )
+                  'image_thumbnail', 'image_medium', 'image_status',
+                  'average_rating', 'can_be_rated', 'liked_by_me', )
         depth = 1
+        list_serializer_class = ProductListSerializer
+
+    def get_number_sold(self, obj):
+        """Number of items on completed orders"""
+        if hasattr(obj, 'sold_count'):
+            return obj.sold_count or 0
+        return obj.number_sold
+
+    def get_average_rating(self, obj):
+        """Average customer rating"""
+        if hasattr(obj, 'rating_average'):
+            return obj.rating_average or 0
+        return obj.average_rating
+
+
+class ProductRowSerializer:
+    """Read-only fast path with the same output as `ProductSerializer`
+
+    Builds each product straight from a `.values()` row instead of going
+    through DRF's per-field `to_representation()`, which is where most of
+    the time of a large product list goes. It honors `?fields=` and
+    `?expand=category` like `ProductSerializer` at the top level, and
+    ignores them when `nested`, like a nested `ProductSerializer`. The
+    per-customer flags are left out; add them with
+    `overlay_customer_flags()`.
+    """
+
+    def __init__(self, request, nested=False):
+        self.request = request
+        requested = None if nested else param_names(request, 'fields')
+
+        self.fields = [
+            field for field in ProductSerializer.Meta.fields
+            if field not in ('can_be_rated', 'liked_by_me') and (
+                requested is None or field == 'id' or field in requested)
+        ]
+        self.expand_category = not nested and expands(request, 'category')
 
+    def values(self, products, *extra):
+        """Read the columns behind the requested fields
 
-class Products(ViewSet):
+        Arguments:
+            products {ProductQuerySet} -- Products to serialize
+            extra {str} -- More columns to read, e.g. a pagination key
+
+        Returns:
+            QuerySet -- The products as dicts
+        """
+        columns = {'id', *extra}
+        for field in self.fields:
+            columns.add(ROW_COLUMNS.get(field, field))
+
+        if columns & {'sold_count', 'rating_average'} and \
+                'sold_count' not in products.query.annotations:
+            products = products.with_aggregates()
+
+        if self.expand_category:
+            columns.update(('category_id', 'category__name'))
+
+        return products.values(*columns)
+
+    def to_representation(self, rows):
+        """Build the serialized products from `values()` rows
+
+        Returns:
+            list -- One dict per row, in row order
+        """
+        getters = [(field, self.getter(field)) for field in self.fields]
+
+        data = []
+        for row in rows:
+            product = {field: get(row) for field, get in getters}
+            if self.expand_category:
+                product['category'] = self.category(row)
+            data.append(product)
+
+        return data
+
+    def category(self, row):
+        """The expanded category of a row read with the category columns"""
+        return {
+            'id': row['category_id'],
+            'url': reverse('productcategory-detail',
+                           args=[row['category_id']], request=self.request),
+            'name': row['category__name'],
+        }
+
+    def getter(self, field):
+        """The function turning a row into the value of `field`"""
+        if field == 'price':
+            return lambda row: float(row['price'])
+        if field == 'quantity':
+            return lambda row: int(row['quantity'])
+        if field == 'created_date':
+            return lambda row: row['created_date'].isoformat() \
+                if row['created_date'] else None
+        if field in ('number_sold', 'average_rating'):
+            column = ROW_COLUMNS[field]
+            return lambda row: row[column] or 0
+        if field in ('image_path', 'image_thumbnail', 'image_medium'):
+            storage = Product._meta.get_field(field).storage
+            return lambda row: self.file_url(storage, row[field])
+        return itemgetter(field)
+
+    def file_url(self, storage, name):
+        """The absolute URL of a stored file, like DRF's ImageField"""
+        if not name:
+            return None
+
+        url = storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+
+def product_list_validators(view, request):
+    """Conditional GET validators for the filtered product list"""
+    return view.filter_products(Product.objects.with_aggregates()).aggregate(
+        count=Count('id'),
+        product=Max('updated_at'),
+        stats=Max('stats__updated_at'),
+    )
+
+
+def product_validators(view, request, pk=None):
+    """Conditional GET validators for a single product"""
+    return Product.objects.filter(pk=pk).aggregate(
+        count=Count('id'),
+        product=Max('updated_at'),
+        stats=Max('stats__updated_at'),
+    )
+
+
+class Products(PaginatedViewSetMixin, ViewSet):
     """Request handlers for Products in the Bangazon Platform"""
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    keyset_keys = tuple(PRODUCT_ORDERINGS)
+
+    def get_keyset(self, key):
+        """The indexed (field, tiebreaker) pair for a sort key"""
+        return PRODUCT_ORDERINGS[key]
+
+    def product_queryset(self):
+        """Products with only the joins that the requested fields need
+
+        The stats join is skipped when `?fields=` leaves out `number_sold`
+        and `average_rating` and the products are not sorted on them.
+        """
+        products = Product.objects.all()
+
+        order = self.request.query_params.get('order_by', None)
+        sorted_on_stats = PRODUCT_ORDERINGS.get(order, ('id', 'id'))[1] != 'id'
+        if sorted_on_stats or wants(self.request, 'number_sold', 'average_rating'):
+            products = products.with_aggregates()
+
+        if expands(self.request, 'category'):
+            products = products.select_related('category')
+
+        return products
 
     def create(self, request):
         """
@@ -44,6 +350,8 @@ class Products(ViewSet):
         @apiParam {Number} quantity Number of items to sell
         @apiParam {String} location City where product is located
         @apiParam {Number} category_id Category of product
+        @apiParam {String} [image_path] Product image as a base64 data URL. It is
+            processed in the background while `image_status` is `pending`
         @apiParamExample {json} Input
             {
                 "name": "Kite",
@@ -63,6 +371,9 @@ class Products(ViewSet):
         @apiSuccess (200) {Date} product.created_date City where product is located
         @apiSuccess (200) {String} product.location City where product is located
         @apiSuccess (200) {String} product.image_path Path to product image
+        @apiSuccess (200) {String} product.image_thumbnail Path to the 150px thumbnail
+        @apiSuccess (200) {String} product.image_medium Path to the 600px image
+        @apiSuccess (200) {String} product.image_status `pending`, `ready` or `failed`, null without an image
         @apiSuccess (200) {Number} product.average_rating Average customer rating of product
         @apiSuccess (200) {Number} product.number_sold How many items have been purchased
         @apiSuccess (200) {Object} product.category Category of product
@@ -78,6 +389,9 @@ class Products(ViewSet):
                 "created_date": "2019-10-23",
                 "location": "Pittsburgh",
                 "image_path": null,
+                "image_thumbnail": null,
+                "image_medium": null,
+                "image_status": null,
                 "average_rating": 0,
                 "category": {
                     "url": "http://localhost:8000/productcategories/6",
@@ -92,33 +406,31 @@ class Products(ViewSet):
         new_product.quantity = request.data["quantity"]
         new_product.location = request.data["location"]
 
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         new_product.customer = customer
 
         product_category = ProductCategory.objects.get(
             pk=request.data["category_id"])
         new_product.category = product_category
 
-        if "image_path" in request.data:
-            format, imgstr = request.data["image_path"].split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(
-                imgstr), name=f'{new_product.id}-{request.data["name"]}.{ext}')
-
-            new_product.image_path = data
-
         try:
             new_product.clean_fields(exclude="image_path")
         except ValidationError as ex:
             return Response({"message": ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
 
-        new_product.save()
+        with transaction.atomic():
+            if "image_path" in request.data:
+                # Decoding and resizing run in the image workers after commit
+                schedule_product_image(new_product, request.data["image_path"])
+
+            new_product.save()
 
         serializer = ProductSerializer(
             new_product, context={'request': request})
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @conditional(product_validators)
     def retrieve(self, request, pk=None):
         """
         @api {GET} /products/:id GET product
@@ -126,6 +438,8 @@ class Products(ViewSet):
         @apiGroup Product
 
         @apiParam {id} id Product Id
+        @apiParam {String} [fields] Comma separated fields to return, e.g. `id,name,price`
+        @apiParam {String} [expand] `category` to add the product category
 
         @apiSuccess (200) {Object} product Created product
         @apiSuccess (200) {id} product.id Product Id
@@ -136,6 +450,9 @@ class Products(ViewSet):
         @apiSuccess (200) {Date} product.created_date City where product is located
         @apiSuccess (200) {String} product.location City where product is located
         @apiSuccess (200) {String} product.image_path Path to product image
+        @apiSuccess (200) {String} product.image_thumbnail Path to the 150px thumbnail
+        @apiSuccess (200) {String} product.image_medium Path to the 600px image
+        @apiSuccess (200) {String} product.image_status `pending`, `ready` or `failed`, null without an image
         @apiSuccess (200) {Number} product.average_rating Average customer rating of product
         @apiSuccess (200) {Number} product.number_sold How many items have been purchased
         @apiSuccess (200) {Object} product.category Category of product
@@ -151,6 +468,9 @@ class Products(ViewSet):
                 "created_date": "2019-10-23",
                 "location": "Pittsburgh",
                 "image_path": null,
+                "image_thumbnail": null,
+                "image_medium": null,
+                "image_status": null,
                 "average_rating": 0,
                 "category": {
                     "url": "http://localhost:8000/productcategories/6",
@@ -158,20 +478,19 @@ class Products(ViewSet):
                 }
             }
         """
+        def build_product():
+            product = self.product_queryset().get(pk=pk)
+            serializer = ProductSerializer(
+                product, context={'request': request})
+            return serializer.data
+
         try:
-            product = Product.objects.get(pk=pk)
-            customer = Customer.objects.get(user=request.auth.user)
+            body, hit = cached_response(request, f'retrieve:{pk}', build_product)
 
-            # Check if a rating for the product/customer combo exists
-            #
-            # If a rating exists, then set `can_be_rated` to False
-            # Else, set it to True
-            product.can_be_rated = not ProductRating.objects.filter(
-                customer=customer, product=product).exists()
+            # `can_be_rated` is False when the customer already rated it
+            overlay_customer_flags([body], request)
 
-            serializer = ProductSerializer(
-                product, context={'request': request})
-            return Response(serializer.data)
+            return Response(body, headers={'X-Cache': 'HIT' if hit else 'MISS'})
 
         except Exception as ex:
             return HttpResponseServerError(ex)
@@ -198,7 +517,7 @@ class Products(ViewSet):
         product.created_date = request.data["created_date"]
         product.location = request.data["location"]
 
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         product.customer = customer
 
         product_category = ProductCategory.objects.get(
@@ -240,12 +559,22 @@ class Products(ViewSet):
         except Exception as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @conditional(product_list_validators, last_modified=False)
     def list(self, request):
         """
         @api {GET} /products GET all products
         @apiName ListProducts
         @apiGroup Product
 
+        @apiParam {Number} [limit] Page size, enables limit/offset pagination
+        @apiParam {Number} [offset] Index of the first product to return
+        @apiParam {String} [cursor] Enables keyset pagination, empty for the first page
+        @apiParam {String} [order_by] Sort key, one of `price`, `created_date`, `name`,
+            `number_sold` or `average_rating`; ties are broken by id
+        @apiParam {String} [direction] `desc` for descending order
+        @apiParam {String} [fields] Comma separated fields to return, e.g. `id,name,price`
+        @apiParam {String} [expand] `category` to add the product category
+
         @apiSuccess (200) {Object[]} products Array of products
         @apiSuccessExample {json} Success
             [
@@ -260,6 +589,9 @@ class Products(ViewSet):
                     "created_date": "2019-10-23",
                     "location": "Pittsburgh",
                     "image_path": null,
+                    "image_thumbnail": null,
+                    "image_medium": null,
+                    "image_status": null,
                     "average_rating": 0,
                     "category": {
                         "url": "http://localhost:8000/productcategories/6",
@@ -267,65 +599,117 @@ class Products(ViewSet):
                     }
                 }
             ]
+        @apiError (400) {String} message Unknown order_by key
         """
-        products = Product.objects.all()
+        order = self.request.query_params.get('order_by', None)
+        if order is not None and order not in PRODUCT_ORDERINGS:
+            return Response(
+                {"message": f"order_by must be one of {', '.join(PRODUCT_ORDERINGS)}."},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        body, hit = cached_response(
+            request, 'list', lambda: self.build_list(request))
+
+        rows = body["results"] if isinstance(body, dict) else body
+        overlay_customer_flags(rows, request)
+
+        return Response(body, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+    def build_list(self, request):
+        """Serialize the filtered product list without per-customer fields
+
+        Returns:
+            list -- The products, or the paginated body when paginating
+        """
+        rows = ProductRowSerializer(request)
+        products = self.filter_products(self.product_queryset())
 
-        # Support filtering by category and/or quantity
-        category = self.request.query_params.get('category', None)
         quantity = self.request.query_params.get('quantity', None)
         order = self.request.query_params.get('order_by', None)
         direction = self.request.query_params.get('direction', None)
-        number_sold = self.request.query_params.get('number_sold', None)
-        min_price = self.request.query_params.get('min_price', None)
-        location = self.request.query_params.get('location', None)
 
+        extra = ()
         if order is not None:
-            order_filter = order
+            products = self.order_products(products, order, direction == "desc")
+            extra = PRODUCT_ORDERINGS[order][:1]
 
-            if direction is not None:
-                if direction == "desc":
-                    order_filter = f'-{order}'
+        # The cursor is built from the key column, even when `?fields=`
+        # leaves it out or the key is the default one
+        if isinstance(self.paginator, KeysetPagination):
+            extra = (self.paginator.key,)
 
-            products = products.order_by(order_filter)
+        products = rows.values(products, *extra)
 
-        if category is not None:
-            products = products.filter(category__id=category)
+        page = self.paginate_queryset(products)
+        if page is not None:
+            return self.get_paginated_response(rows.to_representation(page)).data
 
+        # Slicing has to come last so the filters above stay in the query
         if quantity is not None:
             products = products.order_by("-created_date")[:int(quantity)]
 
-        if number_sold is not None:
-            def sold_filter(product):
-                if product.number_sold >= int(number_sold):
-                    return True
-                return False
+        return rows.to_representation(products)
 
-            products = filter(sold_filter, products)
+    @staticmethod
+    def order_products(products, key, descending=False):
+        """Sort products on one of the PRODUCT_ORDERINGS keys
 
-        if min_price is not None:
-            def min_price_filter(product):
-                if product.price >= float(min_price):
-                    return True
-                return False
+        Sorting on a stats column joins ProductStats with an inner join,
+        so the database can walk the stats index instead of sorting.
+        Every product has a stats row: saving a new product creates it,
+        bulk creates add it themselves and migrating backfills the rest.
+
+        Arguments:
+            products {ProductQuerySet} -- Products from with_aggregates()
+            key {str} -- A PRODUCT_ORDERINGS key
+            descending {bool} -- Sort in descending order
+
+        Returns:
+            ProductQuerySet -- The sorted products
+        """
+        field, tiebreaker = PRODUCT_ORDERINGS[key]
+        if tiebreaker != 'id':
+            products = products.filter(stats__isnull=False)
+
+        prefix = '-' if descending else ''
+        return products.order_by(f'{prefix}{field}', f'{prefix}{tiebreaker}')
+
+    def filter_products(self, products):
+        """Apply the product filter query params as database predicates
+
+        Arguments:
+            products {ProductQuerySet} -- Products to filter
+
+        Returns:
+            ProductQuerySet -- The filtered products
+        """
+        category = self.request.query_params.get('category', None)
+        number_sold = self.request.query_params.get('number_sold', None)
+        min_price = self.request.query_params.get('min_price', None)
+        location = self.request.query_params.get('location', None)
 
-            products = filter(min_price_filter, products)
+        if category is not None:
+            products = products.filter(category__id=category)
+
+        if number_sold is not None:
+            # An inner join on the stats index; every product has a stats row
+            products = products.filter(stats__sold_count__gte=int(number_sold))
+
+        if min_price is not None:
+            products = products.filter(price__gte=float(min_price))
 
         if location is not None:
             products = products.filter(location__contains=location)
 
-        serializer = ProductSerializer(
-            products, many=True, context={'request': request})
-        return Response(serializer.data)
+        return products
 
     @action(methods=['post'], detail=True)
     def rate(self, request, pk=None):
 
         if request.method == "POST":
-            try:
-                customer = Customer.objects.get(user=request.auth.user)
-
-            except Customer.DoesNotExist as ex:
-                return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+            customer = request.customer
+            if customer is None:
+                return Response({'message': 'Customer matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
 
             try:
                 product = Product.objects.get(pk=pk)
@@ -346,7 +730,9 @@ class Products(ViewSet):
 
             try:
                 rated_product.clean_fields()
-                rated_product.save()
+                with transaction.atomic():
+                    rated_product.save()
+                    ProductStats.objects.record_rating(rated_product)
             except ValidationError as ex:
                 return Response({"message": ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -360,11 +746,9 @@ class Products(ViewSet):
     def like(self, request, pk=None):
 
         if request.method == "POST":
-            try:
-                customer = Customer.objects.get(user=request.auth.user)
-
-            except Customer.DoesNotExist as ex:
-                return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+            customer = request.customer
+            if customer is None:
+                return Response({'message': 'Customer matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
 
             try:
                 liked_product = Product.objects.get(pk=pk)
@@ -377,7 +761,9 @@ class Products(ViewSet):
             new_liked_product.product = liked_product
 
             try:
-                new_liked_product.save()
+                with transaction.atomic():
+                    new_liked_product.save()
+                    ProductStats.objects.record_like(liked_product.id, 1)
             except IntegrityError:
                 return Response({"message": "You have already liked that product."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -389,23 +775,456 @@ class Products(ViewSet):
             except LikeProduct.DoesNotExist as ex:
                 return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
 
-            liked_product.delete()
+            with transaction.atomic():
+                liked_product.delete()
+                ProductStats.objects.record_like(liked_product.product_id, -1)
 
             return Response({}, status=status.HTTP_204_NO_CONTENT)
 
         return Response({}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+    @action(methods=['put'], detail=True, parser_classes=[MultiPartParser, FormParser])
+    def image(self, request, pk=None):
+        """
+        @api {PUT} /products/:id/image PUT a new product image as a multipart upload
+        @apiName UploadProductImage
+        @apiGroup Product
+
+        @apiHeader {String} Authorization Auth token
+        @apiHeaderExample {String} Authorization
+            Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+        @apiParam {id} id Product Id
+        @apiParam {File} image JPEG, PNG, GIF or WEBP image, sent as multipart/form-data
+
+        @apiSuccess (202) {Object} product The product, with `image_status` `pending`
+            until the image has been processed
+        @apiError (400) {String} message No image was sent
+        @apiError (403) {String} message The product belongs to another customer
+        @apiError (413) {String} message The image is larger than the size cap
+        @apiError (415) {String} message The file is not a supported image
+        """
+        try:
+            product = Product.objects.get(pk=pk)
+        except Product.DoesNotExist as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+
+        customer = request.customer
+        if customer is None or product.customer_id != customer.id:
+            return Response({"message": "You can only change images of your own products."}, status=status.HTTP_403_FORBIDDEN)
+
+        # Stream the file to a temporary file on disk, stopping at the size cap
+        limit = ImageSizeLimitHandler(request._request)
+        request._request.upload_handlers = [
+            limit, TemporaryFileUploadHandler(request._request)]
+
+        upload = request.data.get("image", None)
+
+        if limit.too_large:
+            return Response({"message": f"Images can be at most {settings.PRODUCT_IMAGE_MAX_BYTES} bytes."}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if upload is None or isinstance(upload, str):
+            return Response({"message": "Send the image as the image field of a multipart upload."}, status=status.HTTP_400_BAD_REQUEST)
+
+        image_format = sniff_image_format(upload)
+        if image_format is None:
+            return Response({"message": "Images must be JPEG, PNG, GIF or WEBP."}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        old_image = product.image_path.name
+
+        with transaction.atomic():
+            # Moves the temporary file into storage rather than copying it
+            product.image_path.save(
+                f'{product.id}.{IMAGE_FORMATS[image_format]}', upload, save=False)
+            schedule_product_image(product)
+            product.save()
+
+        if old_image:
+            product.image_path.storage.delete(old_image)
+
+        serializer = ProductSerializer(product, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(methods=['post', 'put'], detail=False)
+    def bulk(self, request):
+        """
+        @api {POST} /products/bulk POST many new products
+        @api {PUT} /products/bulk PUT changes to many of your products
+        @apiName BulkProducts
+        @apiGroup Product
+
+        @apiHeader {String} Authorization Auth token
+        @apiHeaderExample {String} Authorization
+            Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+        @apiParam {Object[]} products Products, each with the same fields as POST /products.
+            For PUT every product also needs the `id` of one of your products.
+        @apiParamExample {json} Input
+            [
+                {
+                    "name": "Kite",
+                    "price": 14.99,
+                    "description": "It flies high",
+                    "quantity": 60,
+                    "location": "Pittsburgh",
+                    "category_id": 4
+                }
+            ]
+
+        @apiSuccess (201) {Number[]} ids Ids of the created products, in input order
+        @apiSuccess (200) {Number[]} ids Ids of the updated products, in input order
+        @apiSuccessExample {json} Success
+            {
+                "ids": [101, 102]
+            }
+        @apiError (400) {Object[]} errors Errors of every invalid row. Nothing is
+            written when any row is invalid.
+        @apiErrorExample {json} Error
+            {
+                "errors": [
+                    {
+                        "index": 1,
+                        "message": {
+                            "price": ["Ensure this value is less than or equal to 17500.0."]
+                        }
+                    }
+                ]
+            }
+        """
+        customer = request.customer
+        if customer is None:
+            return Response({'message': 'Customer matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"message": "Send a non-empty array of products."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > BULK_MAX_PRODUCTS:
+            return Response({"message": f"Send at most {BULK_MAX_PRODUCTS} products at a time."}, status=status.HTTP_400_BAD_REQUEST)
+
+        creating = request.method == 'POST'
+        fields = ['name', 'price', 'description', 'quantity', 'location', 'category_id']
+        if not creating:
+            fields.append('id')
+
+        categories = ProductCategory.objects.in_bulk(
+            row_ids(rows, 'category_id'))
+
+        existing = {}
+        if not creating:
+            existing = Product.objects.filter(customer=customer).in_bulk(
+                row_ids(rows, 'id'))
+
+        products = []
+        errors = []
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                errors.append({"index": index, "message": "Each product must be an object."})
+                continue
+
+            message = {
+                field: ["This field is required."]
+                for field in fields if field not in row
+            }
+            if message:
+                errors.append({"index": index, "message": message})
+                continue
+
+            if creating:
+                product = Product(customer=customer)
+            else:
+                product = existing.get(parse_id(row["id"]))
+                if product is None:
+                    errors.append({"index": index, "message": {"id": ["Product does not exist."]}})
+                    continue
+
+            product.name = row["name"]
+            product.price = row["price"]
+            product.description = row["description"]
+            product.quantity = row["quantity"]
+            product.location = row["location"]
+            category = categories.get(parse_id(row["category_id"]))
+            if category is None:
+                errors.append({"index": index, "message": {"category_id": ["Product category does not exist."]}})
+                continue
+            product.category = category
+
+            try:
+                # The foreign keys were resolved above, so skip their per-row lookups
+                product.clean_fields(exclude=['image_path', 'customer', 'category'])
+            except ValidationError as ex:
+                errors.append({"index": index, "message": ex.message_dict})
+                continue
+
+            products.append(product)
+
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if creating:
+                self.bulk_create_products(products)
+                ProductStats.objects.bulk_create(
+                    [ProductStats(product=product) for product in products],
+                    batch_size=BULK_BATCH_SIZE)
+            else:
+                # bulk_update() does not run auto_now
+                now = timezone.now()
+                for product in products:
+                    product.updated_at = now
+                Product.objects.bulk_update(
+                    products,
+                    ['name', 'price', 'description', 'quantity', 'location',
+                     'category', 'updated_at'],
+                    batch_size=BULK_BATCH_SIZE)
+
+            # Bulk writes send no post_save, so do the signal handlers' work here
+            index_products(products)
+            bump_version_on_commit('product')
+
+        return Response(
+            {"ids": [product.id for product in products]},
+            status=status.HTTP_201_CREATED if creating else status.HTTP_200_OK)
+
+    @staticmethod
+    def bulk_create_products(products):
+        """bulk_create() products and make sure they all have their ids
+
+        Must run inside a transaction. Only some databases return the ids
+        of bulk inserted rows. On SQLite the transaction holds the write
+        lock from the first insert until it commits, so the newest ids in
+        the table are the ones just inserted, in insert order.
+        """
+        Product.objects.bulk_create(products, batch_size=BULK_BATCH_SIZE)
+
+        if products[0].id is None:
+            ids = Product.all_objects.order_by('-id').values_list(
+                'id', flat=True)[:len(products)]
+            for product, pk in zip(products, reversed(list(ids))):
+                product.id = pk
+
     @action(methods=['get'], detail=False)
-    def liked(self, request):
-        customer = Customer.objects.get(user=request.auth.user)
-        liked_products = LikeProduct.objects.filter(customer=customer)
+    def search(self, request):
+        """
+        @api {GET} /products/search?q= Full-text search for products
+        @apiName SearchProducts
+        @apiGroup Product
 
-        serializer = LikedSerializer(
-            liked_products, many=True, context={'request': request}
-        )
+        @apiParam {String} q Words to find in the name, description or location.
+            Each word also matches as a prefix.
+        @apiParam {Number} [category] Only products in this category
+        @apiParam {Number} [min_price] Only products at or above this price
+        @apiParam {Number} [limit] Page size, enables limit/offset pagination
+        @apiParam {Number} [offset] Index of the first product to return
+
+        @apiSuccess (200) {Object[]} products Matching products, best match first
+        @apiError (400) {String} message Missing search text, or a `cursor`, which
+            would page by creation date instead of by rank
+        """
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"message": "The q query param is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if KeysetPagination.cursor_query_param in self.request.query_params:
+            return Response({"message": "Search results are ranked; page them with limit and offset."}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = search_products(
+            self.filter_products(self.product_queryset()), query)
+
+        page = self.paginate_queryset(products)
+        if page is not None:
+            serializer = ProductSerializer(
+                page, many=True, context={'request': request})
+            return self.get_paginated_response(serializer.data)
 
+        serializer = ProductSerializer(
+            products, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(methods=['get'], detail=False)
+    @conditional(product_list_validators, last_modified=False)
+    def facets(self, request):
+        """
+        @api {GET} /products/facets GET facet counts for the filtered catalog
+        @apiName ProductFacets
+        @apiGroup Product
+
+        @apiParam {Number} [category] Only products in this category
+        @apiParam {Number} [number_sold] Only products sold at least this many times
+        @apiParam {Number} [min_price] Only products at or above this price
+        @apiParam {String} [location] Only products whose location contains this text
+
+        @apiSuccess (200) {Object[]} categories Product count of every category with products
+        @apiSuccess (200) {Object[]} prices Product count of every price bucket,
+            `max` is exclusive and null for the last bucket
+        @apiSuccess (200) {Object[]} locations Product count of the most common locations
+        @apiSuccessExample {json} Success
+            {
+                "categories": [
+                    {
+                        "id": 6,
+                        "name": "Games/Toys",
+                        "count": 12
+                    }
+                ],
+                "prices": [
+                    {
+                        "min": 0,
+                        "max": 25,
+                        "count": 7
+                    }
+                ],
+                "locations": [
+                    {
+                        "location": "Pittsburgh",
+                        "count": 4
+                    }
+                ]
+            }
+        """
+        body, hit = cached_response(
+            request, 'facets', self.build_facets)
+
+        return Response(body, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+    def build_facets(self):
+        """Count the filtered products by category, price bucket and location
+
+        Runs one grouped query per facet.
+
+        Returns:
+            dict -- The facet counts
+        """
+        products = self.filter_products(Product.objects.all())
+
+        categories = products.values('category_id', 'category__name').annotate(
+            count=Count('id')).order_by('category__name', 'category_id')
+
+        bounds = list(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + (None,)))
+        bucket_counts = dict(products.annotate(bucket=Case(
+            *[When(price__lt=upper, then=Value(index))
+              for index, (lower, upper) in enumerate(bounds) if upper is not None],
+            default=Value(len(bounds) - 1), output_field=IntegerField(),
+        )).values('bucket').annotate(count=Count('id')).order_by().values_list(
+            'bucket', 'count'))
+
+        locations = products.values('location').annotate(
+            count=Count('id')).order_by('-count', 'location')[:FACET_MAX_LOCATIONS]
+
+        return {
+            'categories': [
+                {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+                for row in categories
+            ],
+            'prices': [
+                {'min': lower, 'max': upper, 'count': bucket_counts.get(index, 0)}
+                for index, (lower, upper) in enumerate(bounds)
+            ],
+            'locations': list(locations),
+        }
+
+    @action(methods=['get'], detail=False)
+    def export(self, request):
+        """
+        @api {GET} /products/export Stream the full product catalog
+        @apiName ExportProducts
+        @apiGroup Product
+
+        @apiParam {String} [output] `json` for a JSON array (default) or `jsonl` for JSON Lines
+        @apiParam {String} [since] ISO date or datetime, only products changed since then
+        @apiParam {Number} [category] Only products in this category
+        @apiParam {Number} [min_price] Only products at or above this price
+        @apiParam {Number} [number_sold] Only products sold at least this many times
+        @apiParam {String} [location] Only products whose location contains this text
+
+        @apiSuccess (200) {Object[]} products Products in id order, serialized as in GET /products
+        @apiError (400) {String} message Invalid output or since value
+        """
+        output = self.request.query_params.get('output', 'json')
+        since = self.request.query_params.get('since', None)
+
+        if output not in ('json', 'jsonl'):
+            return Response({"message": "output must be json or jsonl."}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = self.filter_products(self.product_queryset())
+
+        if since is not None:
+            changed_since = parse_datetime(since)
+            if changed_since is None and parse_date(since) is not None:
+                changed_since = parse_datetime(f'{since}T00:00:00')
+            if changed_since is None:
+                return Response({"message": "since must be an ISO date or datetime."}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(changed_since):
+                changed_since = timezone.make_aware(changed_since)
+
+            products = products.filter(
+                Q(updated_at__gte=changed_since) | Q(stats__updated_at__gte=changed_since))
+
+        rows = self.export_rows(request, products.order_by('id'))
+
+        if output == 'jsonl':
+            response = StreamingHttpResponse(
+                (f'{row}\n' for row in rows), content_type='application/x-ndjson')
+        else:
+            response = StreamingHttpResponse(
+                self.json_array(rows), content_type='application/json')
+
+        response['Content-Disposition'] = f'attachment; filename="products.{output}"'
+        return response
+
+    def export_rows(self, request, products):
+        """Serialize products one at a time as JSON strings
+
+        The queryset is read in chunks with `iterator()`, so memory stays
+        flat however large the catalog is.
+        """
+        context = {'request': request}
+        for product in products.iterator(chunk_size=500):
+            yield json.dumps(
+                ProductSerializer(product, context=context).data,
+                cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+    @staticmethod
+    def json_array(rows):
+        """Wrap JSON strings in a JSON array, one piece at a time"""
+        yield '['
+        for index, row in enumerate(rows):
+            yield row if index == 0 else f',{row}'
+        yield ']'
+
+    @action(methods=['get'], detail=False, permission_classes=[IsAdminUser])
+    def cachestats(self, request):
+        """
+        @api {GET} /products/cachestats GET product response cache counters
+        @apiName ProductCacheStats
+        @apiGroup Product
+
+        @apiHeader {String} Authorization Auth token of a staff user
+
+        @apiSuccess (200) {Number} hits Requests this worker answered from the cache
+        @apiSuccess (200) {Number} misses Requests this worker rebuilt the body for
+        """
+        return Response(cache_stats())
+
+    @action(methods=['get'], detail=False)
+    def liked(self, request):
+        customer = request.customer
+        likes = LikeProduct.objects.filter(customer=customer).values_list(
+            'id', 'product_id', 'product__name', 'product__description')
+
+        # Same body as LikedSerializer, without a serializer per like
+        liked = [
+            {
+                'id': like_id,
+                'product': {
+                    'id': product_id,
+                    'url': reverse('product-detail', args=[product_id], request=request),
+                    'name': name,
+                    'description': description,
+                },
+            }
+            for like_id, product_id, name, description in likes
+        ]
+
+        return Response(liked)
+
 
 class ProductLikeSerializer(serializers.HyperlinkedModelSerializer):
     """
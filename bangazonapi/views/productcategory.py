@@ -5,12 +5,15 @@
 """
 
 """View module for handling requests about product categories"""
+from django.db.models import Count, Max
 from django.http import HttpResponseServerError
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
 from bangazonapi.models import ProductCategory
+from bangazonapi.conditional import conditional
+from bangazonapi.pagination import PaginatedViewSetMixin
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 
 
@@ -25,7 +28,19 @@ class ProductCategorySerializer(serializers.HyperlinkedModelSerializer):
         fields = ('id', 'url', 'name')
 
 
-class ProductCategories(ViewSet):
+def category_list_validators(view, request):
+    """Conditional GET validators for the category list"""
+    return ProductCategory.objects.aggregate(
+        count=Count('id'), category=Max('updated_at'))
+
+
+def category_validators(view, request, pk=None):
+    """Conditional GET validators for a single category"""
+    return ProductCategory.objects.filter(pk=pk).aggregate(
+        count=Count('id'), category=Max('updated_at'))
+
+
+class ProductCategories(PaginatedViewSetMixin, ViewSet):
     """Categories for products"""
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
@@ -43,6 +58,7 @@ class ProductCategories(ViewSet):
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @conditional(category_validators)
     def retrieve(self, request, pk=None):
         """Handle GET requests for single category"""
         try:
@@ -52,6 +68,7 @@ class ProductCategories(ViewSet):
         except Exception as ex:
             return HttpResponseServerError(ex)
 
+    @conditional(category_list_validators, last_modified=False)
     def list(self, request):
         """Handle GET requests to ProductCategory resource"""
         product_category = ProductCategory.objects.all()
@@ -61,6 +78,12 @@ class ProductCategories(ViewSet):
         # if name is not None:
         #     ProductCategories = ProductCategories.filter(name=name)
 
+        page = self.paginate_queryset(product_category)
+        if page is not None:
+            serializer = ProductCategorySerializer(
+                page, many=True, context={'request': request})
+            return self.get_paginated_response(serializer.data)
+
         serializer = ProductCategorySerializer(
             product_category, many=True, context={'request': request})
         return Response(serializer.data)
@@ -1,6 +1,6 @@
 """View module for handling requests about customer profiles"""
-import datetime
 from django.db import IntegrityError
+from django.db.models import Count, Max
 from django.http import HttpResponseServerError
 from django.contrib.auth.models import User
 from rest_framework import serializers, status
@@ -8,15 +8,43 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
+from bangazonapi.authentication import get_full_customer
+from bangazonapi.conditional import auth_user_id, conditional
+from bangazonapi.fieldsets import SparseFieldsetMixin, expands
 from bangazonapi.models import Order, Customer, Product, OrderProduct, Favorite
 from .product import ProductSerializer
-from .order import OrderSerializer
+from .cart import cart_validators, serialize_cart
+
+
+def profile_validators(view, request):
+    """Conditional GET validators for the customer profile
+
+    Users have no `updated_at`, so the user fields the profile renders
+    are part of the validators themselves. Favorites have none either,
+    so with `?expand=favorites` their count and newest id stand in.
+    """
+    aggregates = {
+        'customer': Max('updated_at'),
+        'first_name': Max('user__first_name'),
+        'last_name': Max('user__last_name'),
+        'email': Max('user__email'),
+        'payment_types': Count('payment_types', distinct=True),
+        'payment_type': Max('payment_types__updated_at'),
+    }
+    if expands(request, 'favorites'):
+        aggregates.update(
+            favorites=Count('favorite', distinct=True),
+            favorite=Max('favorite__id'),
+        )
+
+    return Customer.objects.filter(user_id=auth_user_id(request)).aggregate(**aggregates)
 
 
 class Profile(ViewSet):
     """Request handlers for user profile info in the Bangazon Platform"""
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
+    @conditional(profile_validators, last_modified=False)
     def list(self, request):
         """
         @api {GET} /profile GET user profile info
@@ -27,6 +55,9 @@ class Profile(ViewSet):
         @apiHeaderExample {String} Authorization
             Token 9ba45f09651c5b0c404f37a2d2572c026c146611
 
+        @apiParam {String} [fields] Comma separated fields to return, e.g. `id,user`
+        @apiParam {String} [expand] `favorites` to add the favorite sellers
+
         @apiSuccess (200) {Number} id Profile id
         @apiSuccess (200) {String} url URI of customer profile
         @apiSuccess (200) {Object} user Related user object
@@ -63,7 +94,7 @@ class Profile(ViewSet):
             }
         """
         try:
-            current_user = Customer.objects.get(user=request.auth.user)
+            current_user = get_full_customer(request)
             serializer = ProfileSerializer(
                 current_user, many=False, context={'request': request})
             return Response(serializer.data)
@@ -71,10 +102,11 @@ class Profile(ViewSet):
             return HttpResponseServerError(ex)
 
     @action(methods=['get', 'post', 'delete'], detail=False)
+    @conditional(cart_validators, last_modified=False)
     def cart(self, request):
         """Shopping cart manipulation"""
 
-        current_user = Customer.objects.get(user=request.auth.user)
+        current_user = request.customer
 
         if request.method == "DELETE":
             """
@@ -119,6 +151,7 @@ class Profile(ViewSet):
             @apiSuccess (200) {Number} size Number of items in cart
             @apiSuccess (200) {Object[]} line_items Line items in cart
             @apiSuccess (200) {Number} line_items.id Line item id
+            @apiSuccess (200) {Number} line_items.quantity Units of the product in cart
             @apiSuccess (200) {Object} line_items.product Product in cart
             @apiSuccessExample {json} Success
                 {
@@ -154,21 +187,11 @@ class Profile(ViewSet):
             @apiError (404) {String} message  Not found message
             """
             try:
-                open_order = Order.objects.get(
-                    customer=current_user, payment_type=None)
-                line_items = OrderProduct.objects.filter(order=open_order)
-                line_items = LineItemSerializer(
-                    line_items, many=True, context={'request': request})
-
-                cart = {}
-                cart["order"] = OrderSerializer(open_order, many=False, context={
-                                                'request': request}).data
-                cart["order"]["size"] = len(line_items.data)
-
+                cart = serialize_cart(request, with_products=False)
             except Order.DoesNotExist as ex:
                 return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
 
-            return Response(cart["order"])
+            return Response(cart)
 
         if request.method == "POST":
             """
@@ -182,11 +205,13 @@ class Profile(ViewSet):
 
             @apiSuccess (200) {Object} line_item Line items in cart
             @apiSuccess (200) {Number} line_item.id Line item id
+            @apiSuccess (200) {Number} line_item.quantity Units of the product in cart
             @apiSuccess (200) {Object} line_item.product Product in cart
             @apiSuccess (200) {Object} line_item.order Open order for cart
             @apiSuccessExample {json} Success
                 {
                     "id": 14,
+                    "quantity": 1,
                     "product": {
                         "url": "http://localhost:8000/products/52",
                         "deleted": null,
@@ -211,21 +236,11 @@ class Profile(ViewSet):
             @apiError (404) {String} message  Not found message
             """
 
-            try:
-                open_order = Order.objects.get(
-                    customer=current_user, payment_type__isnull=True)
+            open_order, _ = Order.objects.get_or_create_open(current_user)
 
-            except Order.DoesNotExist as ex:
-                open_order = Order()
-                open_order.created_date = datetime.datetime.now()
-                open_order.customer = current_user
-                open_order.save()
-
-            line_item = OrderProduct()
-            line_item.product = Product.objects.get(
-                pk=request.data["product_id"])
-            line_item.order = open_order
-            line_item.save()
+            product = Product.objects.get(pk=request.data["product_id"])
+            OrderProduct.objects.change_quantity(open_order, product.id, 1)
+            line_item = OrderProduct.objects.get(order=open_order, product=product)
 
             line_item_json = LineItemSerializer(
                 line_item, many=False, context={'request': request})
@@ -284,7 +299,7 @@ class Profile(ViewSet):
                     }
                 ]
             """
-            customer = Customer.objects.get(user=request.auth.user)
+            customer = request.customer
             favorites = Favorite.objects.filter(customer=customer)
 
             serializer = FavoriteSerializer(
@@ -304,8 +319,11 @@ class Profile(ViewSet):
             @apiSuccessExample {json} Success
                 HTTP/1.1 204 No Content
             """
+            customer = request.customer
+            if customer is None:
+                return Response({'message': 'Customer matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+
             try:
-                customer = Customer.objects.get(user=request.auth.user)
                 seller = Customer.objects.get(pk=request.data["seller"])
 
             except Customer.DoesNotExist as ex:
@@ -333,7 +351,7 @@ class LineItemSerializer(serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = OrderProduct
-        fields = ('id', 'product')
+        fields = ('id', 'quantity', 'product')
         depth = 1
 
 
@@ -349,13 +367,19 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
         depth = 1
 
 
-class ProfileSerializer(serializers.HyperlinkedModelSerializer):
+class ProfileSerializer(SparseFieldsetMixin, serializers.HyperlinkedModelSerializer):
     """JSON serializer for customer profile
 
+    `?expand=favorites` adds the customer's favorite sellers.
+
     Arguments:
         serializers
     """
     user = UserSerializer(many=False)
+    expandable_fields = {
+        'favorites': lambda: FavoriteSerializer(
+            many=True, read_only=True, source='favorite_set'),
+    }
 
     class Meta:
         model = Customer
@@ -3,6 +3,7 @@ import json
 from django.http import HttpResponse, HttpResponseNotAllowed
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from rest_framework.authtoken.models import Token
@@ -53,27 +54,34 @@ def register_user(request):
     # Load the JSON string of the request body into a dict
     req_body = json.loads(request.body.decode())
 
-    # Create a new user by invoking the `create_user` helper method
-    # on Django's built-in User model
-    new_user = User.objects.create_user(
-        username=req_body['username'],
-        email=req_body['email'],
-        password=req_body['password'],
+    # Hash the password before opening the transaction, so the slow
+    # PBKDF2 work does not hold the database write lock
+    new_user = User(
+        username=User.normalize_username(req_body['username']),
+        email=User.objects.normalize_email(req_body['email']),
         first_name=req_body['first_name'],
         last_name=req_body['last_name']
     )
+    new_user.set_password(req_body['password'])
 
-    customer = Customer.objects.create(
+    customer = Customer(
         phone_number=req_body['phone_number'],
-        address=req_body['address'],
-        user=new_user
+        address=req_body['address']
     )
 
-    # Commit the user to the database by saving it
-    customer.save()
+    # The user, customer and token are created together or not at all
+    try:
+        with transaction.atomic():
+            new_user.save(force_insert=True)
 
-    # Use the REST Framework's token generator on the new user account
-    token = Token.objects.create(user=new_user)
+            customer.user = new_user
+            customer.save(force_insert=True)
+
+            # Use the REST Framework's token generator on the new user account
+            token = Token.objects.create(user=new_user)
+    except IntegrityError:
+        data = json.dumps({"message": "That username is already taken."})
+        return HttpResponse(data, content_type='application/json', status=status.HTTP_400_BAD_REQUEST)
 
     # Return the token to the client
     data = json.dumps({"token": token.key, "id": new_user.id})
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
 from django.contrib.auth.models import User
+from bangazonapi.pagination import PaginatedViewSetMixin
 
 
 class UserSerializer(serializers.HyperlinkedModelSerializer):
@@ -21,7 +22,7 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('id', 'url', 'username', 'password', 'first_name', 'last_name', 'email', 'is_active', 'date_joined')
 
 
-class Users(ViewSet):
+class Users(PaginatedViewSetMixin, ViewSet):
     """Users for Bangazon
     Purpose: Allow a user to communicate with the Bangazon database to GET PUT POST and DELETE Users.
     Methods: GET PUT(id) POST
@@ -47,6 +48,13 @@ class Users(ViewSet):
     def list(self, request):
         """Handle GET requests to user resource"""
         users = User.objects.all()
+
+        page = self.paginate_queryset(users)
+        if page is not None:
+            serializer = UserSerializer(
+                page, many=True, context={'request': request})
+            return self.get_paginated_response(serializer.data)
+
         serializer = UserSerializer(
             users, many=True, context={'request': request})
         return Response(serializer.data)
\ No newline at end of file
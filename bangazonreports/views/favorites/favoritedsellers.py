@@ -4,6 +4,31 @@ from django.shortcuts import render
 from bangazonreports.views import Connection
 
 
+FAVORITED_SELLERS_SQL = """
+    SELECT
+        buyer_user.first_name as user,
+        seller_user.first_name as favorited_seller
+    FROM
+        bangazonapi_favorite as fav
+    JOIN
+        bangazonapi_customer as seller_cust
+        ON
+            seller_cust.id = fav.seller_id
+    JOIN
+        auth_user as seller_user
+        ON
+            seller_user.id = seller_cust.user_id
+    JOIN
+        bangazonapi_customer as buyer_cust
+        ON
+            buyer_cust.id = fav.customer_id
+    JOIN
+        auth_user as buyer_user
+        ON
+            buyer_user.id = buyer_cust.user_id
+"""
+
+
 def list_favorited_sellers(request):
     """Function to build an HTML report for favorited sellers by customer"""
     if request.method == "GET":
@@ -12,29 +37,7 @@ def list_favorited_sellers(request):
             db_cursor = conn.cursor()
 
             # Query for all customers and their favorite sellers
-            db_cursor.execute("""
-            SELECT
-            	buyer_user.first_name as user,
-	            seller_user.first_name as favorited_seller
-            FROM
-	            bangazonapi_favorite as fav
-            JOIN
-	            bangazonapi_customer as seller_cust
-	            ON
-		            seller_cust.id = fav.seller_id
-            JOIN
-	            auth_user as seller_user
-	            ON
-		            seller_user.id = seller_cust.user_id
-            JOIN
-	            bangazonapi_customer as buyer_cust
-	            ON
-		            buyer_cust.id = fav.customer_id
-            JOIN
-	            auth_user as buyer_user
-	            ON
-		            buyer_user.id = buyer_cust.user_id
-            """)
+            db_cursor.execute(FAVORITED_SELLERS_SQL)
 
             dataset = db_cursor.fetchall()
 
@@ -4,6 +4,35 @@ from django.shortcuts import render
 from bangazonreports.views import Connection
 
 
+# The total is the subtotal stored at checkout, so later price changes
+# do not alter it and the line items and products are not read
+COMPLETED_ORDERS_SQL = """
+    SELECT
+        b_ord.id as order_id,
+        user.first_name || ' ' || user.last_name as customer_name,
+        b_pay.merchant_name as payment_type,
+        b_ord.subtotal as total_paid
+    FROM
+        bangazonapi_order b_ord
+    JOIN
+        bangazonapi_customer b_cust
+    ON
+        b_ord.customer_id = b_cust.id
+    JOIN
+        auth_user user
+    ON
+        b_cust.user_id = user.id
+    JOIN
+        bangazonapi_payment b_pay
+    ON
+        b_ord.payment_type_id = b_pay.id
+    WHERE
+        b_ord.item_count > 0
+    ORDER BY
+        b_ord.id
+"""
+
+
 def list_completed_orders(request):
     """Function to build an HTML report for completed orders"""
     if request.method == "GET":
@@ -12,37 +41,7 @@ def list_completed_orders(request):
             db_cursor = conn.cursor()
 
             # Query for all orders that are completed
-            db_cursor.execute("""
-                SELECT
-	                b_op.order_id,
-	                user.first_name || ' ' || user.last_name as customer_name,
-	                b_pay.merchant_name as payment_type,
-	                sum(b_prod.price) as total_paid
-                FROM 
-                    bangazonapi_order b_ord
-                JOIN 
-                    bangazonapi_customer b_cust
-                ON
-                    b_ord.customer_id = b_cust.id
-                JOIN
-                    auth_user user
-                ON
-                    b_cust.user_id = user.id
-                JOIN
-                    bangazonapi_orderproduct b_op
-                ON
-                    b_ord.id = b_op.order_id
-                JOIN
-                    bangazonapi_product b_prod
-                ON
-                    b_op.product_id = b_prod.id
-                JOIN
-                    bangazonapi_payment b_pay
-                ON
-                    b_ord.payment_type_id = b_pay.id
-                GROUP BY
-                    order_id
-            """)
+            db_cursor.execute(COMPLETED_ORDERS_SQL)
 
             dataset = db_cursor.fetchall()
 
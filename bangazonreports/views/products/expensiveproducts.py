@@ -5,6 +5,23 @@ from bangazonapi.models import Product
 from bangazonreports.views import Connection
 
 
+EXPENSIVE_PRODUCTS_SQL = """
+    SELECT
+        p.name,
+        p.price,
+        p.description,
+        p.quantity,
+        p.created_date,
+        p.location
+    FROM
+        bangazonapi_product p
+    WHERE
+        p.price >= 1000
+    ORDER BY
+        p.price ASC
+"""
+
+
 def list_expensive_products(request):
     """Function to build an HTML report of expensive products"""
     if request.method == "GET":
@@ -13,21 +30,7 @@ def list_expensive_products(request):
             db_cursor = conn.cursor()
 
             # Query for all products with a price greater than $1000
-            db_cursor.execute("""
-                SELECT
-                    p.name,
-                    p.price,
-                    p.description,
-                    p.quantity,
-                    p.created_date,
-                    p.location
-                FROM
-                    bangazonapi_product p
-                WHERE
-                    p.price >= 1000
-                ORDER BY
-                    p.price ASC
-            """)
+            db_cursor.execute(EXPENSIVE_PRODUCTS_SQL)
 
             dataset = db_cursor.fetchall()
 
@@ -4,6 +4,37 @@ from django.shortcuts import render
 from bangazonreports.views import Connection
 
 
+INCOMPLETE_ORDERS_SQL = """
+    SELECT
+        b_op.order_id,
+        user.first_name || ' ' || user.last_name as customer_name,
+        sum(b_prod.price * b_op.quantity) as total_cost
+    FROM
+        bangazonapi_order b_ord
+    JOIN
+        bangazonapi_customer b_cust
+    ON
+        b_ord.customer_id = b_cust.id
+    JOIN
+        auth_user user
+    ON
+        b_cust.user_id = user.id
+    JOIN
+        bangazonapi_orderproduct b_op
+    ON
+        b_ord.id = b_op.order_id
+    JOIN
+        bangazonapi_product b_prod
+    ON
+        b_op.product_id = b_prod.id
+    WHERE
+        b_ord.payment_type_id
+            IS NULL
+    GROUP BY
+        b_ord.id
+"""
+
+
 def list_incomplete_orders(request):
     """Function to build an HTML report for completed orders"""
     if request.method == "GET":
@@ -12,35 +43,7 @@ def list_incomplete_orders(request):
             db_cursor = conn.cursor()
 
             # Query for all orders that are completed
-            db_cursor.execute("""
-                SELECT
-	                b_op.order_id,
-	                user.first_name || ' ' || user.last_name as customer_name,
-	                sum(b_prod.price) as total_cost
-                FROM 
-                    bangazonapi_order b_ord
-                JOIN 
-                    bangazonapi_customer b_cust
-                ON
-                    b_ord.customer_id = b_cust.id
-                JOIN
-                    auth_user user
-                ON
-                    b_cust.user_id = user.id
-                JOIN
-                    bangazonapi_orderproduct b_op
-                ON
-                    b_ord.id = b_op.order_id
-                JOIN
-                    bangazonapi_product b_prod
-                ON
-                    b_op.product_id = b_prod.id
-                WHERE
-                    b_ord.payment_type_id
-                        IS NULL
-                GROUP BY
-                    order_id
-            """)
+            db_cursor.execute(INCOMPLETE_ORDERS_SQL)
 
             dataset = db_cursor.fetchall()
 
@@ -4,6 +4,23 @@ from django.shortcuts import render
 from bangazonreports.views import Connection
 
 
+INEXPENSIVE_PRODUCTS_SQL = """
+    SELECT
+        p.name,
+        p.price,
+        p.description,
+        p.quantity,
+        p.created_date,
+        p.location
+    FROM
+        bangazonapi_product p
+    WHERE
+        p.price < 1000
+    ORDER BY
+        p.price ASC
+"""
+
+
 def list_inexpensive_products(request):
     """Function to build an HTML report of inexpensive products"""
     if request.method == "GET":
@@ -12,21 +29,7 @@ def list_inexpensive_products(request):
             db_cursor = conn.cursor()
 
             # Query for all products with a price greater than $1000
-            db_cursor.execute("""
-                SELECT
-                    p.name,
-                    p.price,
-                    p.description,
-                    p.quantity,
-                    p.created_date,
-                    p.location
-                FROM
-                    bangazonapi_product p
-                WHERE
-                    p.price < 1000
-                ORDER BY
-                    p.price ASC
-            """)
+            db_cursor.execute(INEXPENSIVE_PRODUCTS_SQL)
 
             dataset = db_cursor.fetchall()
 
@@ -3,3 +3,9 @@ from .order import OrderTests
 from .payments import PaymentTests
 from .profile import ProfileTests
 from .lineitem import LineitemTests
+from .productstats import ProductStatsTests
+from .queryplans import QueryPlanTests
+from .productrows import ProductRowsTests
+from .register import RegisterTests
+from .openorder import OpenOrderTests
+from .checkout import CheckoutTests
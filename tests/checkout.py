@@ -0,0 +1,167 @@
+import json
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from bangazonapi.models import (Customer, Order, OrderProduct, Payment, Product,
+                                ProductCategory, ProductStats)
+from bangazonreports.views.products.completedorders import COMPLETED_ORDERS_SQL
+from .openorder import run_in_threads
+
+
+class CheckoutTests(TransactionTestCase):
+    """
+    Check that checkout takes units out of stock without overselling
+    """
+    BUYERS = 8
+
+    def setUp(self) -> None:
+        """
+        Create a seller with two products and buyers with a payment type each
+        """
+        seller = self.create_customer("seller")
+        category = ProductCategory.objects.create(name="Sporting Goods")
+        self.kite, self.ball = [
+            Product.objects.create(
+                name=name, price=price, description="Fun", quantity=5,
+                location="Pittsburgh", customer=seller, category=category)
+            for name, price in (("Kite", 14.99), ("Ball", 5))
+        ]
+
+        self.buyers = [self.create_customer(f"buyer{index}") for index in range(self.BUYERS)]
+
+    def create_customer(self, username):
+        user = User.objects.create_user(username=username, password="Admin8*")
+        customer = Customer.objects.create(
+            user=user, phone_number="555-1212", address="100 Infinity Way")
+        customer.token = Token.objects.create(user=user).key
+        customer.payment = Payment.objects.create(
+            merchant_name="American Express", account_number="111-1111-1111",
+            customer=customer, expiration_date="2024-12-31", create_date="2019-04-12")
+        return customer
+
+    def fill_cart(self, customer, **units):
+        """
+        Give the customer an open order with `units` of each named product
+        """
+        order, _ = Order.objects.get_or_create_open(customer)
+        for name, quantity in units.items():
+            OrderProduct.objects.change_quantity(order, getattr(self, name).id, quantity)
+        return order
+
+    def checkout(self, customer, order):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + customer.token)
+        return client.put(f"/orders/{order.id}", {"payment_type": customer.payment.id}, format='json')
+
+    def test_checkout_decrements_stock(self):
+        """
+        Ensure paying for an order takes its units out of stock once
+        """
+        buyer = self.buyers[0]
+        order = self.fill_cart(buyer, kite=2, ball=5)
+
+        response = self.checkout(buyer, order)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.kite.refresh_from_db()
+        self.ball.refresh_from_db()
+        self.assertEqual((self.kite.quantity, self.ball.quantity), (3, 0))
+        self.assertEqual(ProductStats.objects.get(product=self.ball).sold_count, 5)
+
+        # Changing the payment type of a paid order takes nothing more
+        response = self.checkout(buyer, order)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.kite.refresh_from_db()
+        self.assertEqual(self.kite.quantity, 3)
+
+    def test_checkout_out_of_stock(self):
+        """
+        Ensure a short item fails the whole checkout and lists what is short
+        """
+        buyer = self.buyers[0]
+        order = self.fill_cart(buyer, kite=2, ball=6)
+
+        response = self.checkout(buyer, order)
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(json_response["out_of_stock"], [
+            {"product_id": self.ball.id, "requested": 6, "available": 5}])
+
+        # Nothing was written: the order is open and the kites are in stock
+        order.refresh_from_db()
+        self.kite.refresh_from_db()
+        self.assertIsNone(order.payment_type_id)
+        self.assertEqual(self.kite.quantity, 5)
+
+    def test_checkout_snapshots_totals(self):
+        """
+        Ensure checkout stores the prices paid and later price changes keep them
+        """
+        buyer = self.buyers[0]
+        order = self.fill_cart(buyer, kite=2, ball=1)
+        self.checkout(buyer, order)
+
+        Product.objects.filter(pk=self.kite.id).update(price=99)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + buyer.token)
+        # Validators and orders, without reading line items or products
+        with self.assertNumQueries(2):
+            response = client.get("/orders?fields=id,subtotal,item_count", None, format='json')
+        self.assertEqual(json.loads(response.content),
+                         [{"id": order.id, "subtotal": 34.98, "item_count": 3}])
+
+        response = client.get(f"/orders/{order.id}", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual([(item["quantity"], item["unit_price"]) for item in json_response["lineitems"]],
+                         [(2, 14.99), (1, 5.0)])
+
+        with connection.cursor() as cursor:
+            cursor.execute(COMPLETED_ORDERS_SQL)
+            self.assertEqual([row[-1] for row in cursor.fetchall()], [34.98])
+
+    def test_concurrent_checkouts(self):
+        """
+        Ensure parallel checkouts sell exactly the units in stock
+        """
+        orders = [self.fill_cart(buyer, kite=1) for buyer in self.buyers]
+
+        results = run_in_threads(
+            self.BUYERS, lambda index: self.checkout(self.buyers[index], orders[index]).status_code)
+
+        self.assertEqual(sorted(results), [204] * 5 + [409] * (self.BUYERS - 5))
+        self.kite.refresh_from_db()
+        self.assertEqual(self.kite.quantity, 0)
+        self.assertEqual(Order.objects.filter(payment_type__isnull=False).count(), 5)
+        self.assertEqual(ProductStats.objects.get(product=self.kite).sold_count, 5)
+
+    def test_concurrent_payments_of_one_order(self):
+        """
+        Ensure paying the same order twice at once keeps the checkout totals
+        """
+        buyer = self.buyers[0]
+        order = self.fill_cart(buyer, kite=2)
+
+        results = run_in_threads(2, lambda index: self.checkout(buyer, order).status_code)
+
+        self.assertEqual(results, [204, 204])
+        order.refresh_from_db()
+        self.assertEqual((order.subtotal, order.item_count), (29.98, 2))
+        self.kite.refresh_from_db()
+        self.assertEqual(self.kite.quantity, 3)
+
+        with connection.cursor() as cursor:
+            cursor.execute(COMPLETED_ORDERS_SQL)
+            self.assertEqual([row[0] for row in cursor.fetchall()], [order.id])
+
+    def test_connections_use_wal(self):
+        """
+        Ensure SQLite connections run in write-ahead logging mode
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
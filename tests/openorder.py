@@ -0,0 +1,121 @@
+import threading
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.test import TransactionTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from bangazonapi.models import Customer, Order, OrderProduct, Payment, Product, ProductCategory
+
+
+def run_in_threads(count, target):
+    """Call `target(index)` in `count` threads that start together
+
+    Each thread closes its own database connection when it is done.
+
+    Returns:
+        list -- The result of each call, or the exception it raised
+    """
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(index):
+        try:
+            barrier.wait()
+            results[index] = target(index)
+        except Exception as ex:
+            results[index] = ex
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+class OpenOrderTests(TransactionTestCase):
+    """
+    Check that concurrent requests never give a customer two open orders
+    """
+    THREADS = 8
+
+    def setUp(self) -> None:
+        user = User.objects.create_user(username="steve", password="Admin8*")
+        self.customer = Customer.objects.create(
+            user=user, phone_number="555-1212", address="100 Infinity Way")
+        self.token = Token.objects.create(user=user).key
+
+        category = ProductCategory.objects.create(name="Sporting Goods")
+        self.product = Product.objects.create(
+            name="Kite", price=14.99, description="It flies high", quantity=60,
+            location="Pittsburgh", customer=self.customer, category=category)
+
+    def test_second_open_order_is_rejected(self):
+        """
+        Ensure the database refuses a second open order for a customer
+        """
+        Order.objects.create(customer=self.customer, created_date="2019-04-12")
+
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Order.objects.create(customer=self.customer, created_date="2019-04-12")
+
+        # Paying for the cart lets the customer open a new one
+        payment = Payment.objects.create(
+            merchant_name="American Express", account_number="111-1111-1111",
+            customer=self.customer, expiration_date="2024-12-31", create_date="2019-04-12")
+        Order.objects.update(payment_type=payment)
+
+        order, created = Order.objects.get_or_create_open(self.customer)
+        self.assertTrue(created)
+        self.assertEqual(Order.objects.filter(customer=self.customer).count(), 2)
+
+    def test_concurrent_get_or_create_open(self):
+        """
+        Ensure parallel calls all get the same single open order
+        """
+        results = run_in_threads(
+            self.THREADS, lambda index: Order.objects.get_or_create_open(self.customer))
+
+        for result in results:
+            self.assertNotIsInstance(result, Exception)
+        self.assertEqual(len({order.id for order, _ in results}), 1)
+        self.assertEqual(sum(created for _, created in results), 1)
+        self.assertEqual(Order.objects.filter(customer=self.customer).count(), 1)
+
+    def test_concurrent_add_to_cart(self):
+        """
+        Ensure parallel add-to-cart requests fill one cart
+        """
+        def add_to_cart(index):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+            return client.post("/cart", {"product_id": self.product.id}, format='json').status_code
+
+        self.assertEqual(run_in_threads(self.THREADS, add_to_cart), [204] * self.THREADS)
+
+        order = Order.objects.get(customer=self.customer, payment_type=None)
+        line_item = OrderProduct.objects.get(order=order)
+        self.assertEqual(line_item.quantity, self.THREADS)
+
+    def test_concurrent_remove_from_cart(self):
+        """
+        Ensure parallel removals never leave an empty line item or fail
+        """
+        order, _ = Order.objects.get_or_create_open(self.customer)
+        OrderProduct.objects.change_quantity(order, self.product.id, self.THREADS)
+
+        results = run_in_threads(
+            self.THREADS,
+            lambda index: OrderProduct.objects.change_quantity(order, self.product.id, -1))
+
+        self.assertEqual(results, [None] * self.THREADS)
+        self.assertFalse(OrderProduct.objects.filter(order=order).exists())
+
+        # Removing more units than the line holds deletes it too
+        OrderProduct.objects.change_quantity(order, self.product.id, 1)
+        OrderProduct.objects.change_quantity(order, self.product.id, -3)
+        self.assertFalse(OrderProduct.objects.filter(order=order).exists())
@@ -1,5 +1,7 @@
 import datetime
 import json
+import time
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.test import APITestCase
 
@@ -67,6 +69,75 @@ class OrderTests(APITestCase):
         self.assertEqual(json_response["size"], 1)
         self.assertEqual(len(json_response["lineitems"]), 1)
 
+    def test_cart_query_count(self):
+        """
+        Ensure the cart is read in the same number of queries however full it is
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.client.post("/cart", {"product_id": 1}, format='json')
+
+        # Validators, order, line items, products, then the two customer flags
+        with self.assertNumQueries(6):
+            response = self.client.get("/cart", None, format='json')
+        self.assertEqual(json.loads(response.content)["size"], 1)
+
+        data = {"name": "Ball", "price": 5, "quantity": 3,
+                "description": "Round", "category_id": 1, "location": "Nashville"}
+        self.client.post("/products", data, format='json')
+        for product_id in (2, 1, 2):
+            self.client.post("/cart", {"product_id": product_id}, format='json')
+
+        with self.assertNumQueries(6):
+            response = self.client.get("/cart", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["size"], 4)
+        self.assertEqual([item["product"]["id"] for item in json_response["lineitems"]], [1, 2])
+        self.assertEqual([item["quantity"] for item in json_response["lineitems"]], [2, 2])
+        self.assertEqual([product["id"] for product in json_response["products"]], [1, 2])
+
+        # The profile cart has no product list, so skips it and the flags
+        with self.assertNumQueries(4):
+            response = self.client.get("/profile/cart", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["size"], 4)
+        self.assertEqual(json_response["lineitems"][1]["product"]["name"], "Ball")
+
+    def test_cart_conditional_get(self):
+        """
+        Ensure polling an unchanged cart gets a 304 and a changed cart does not
+        """
+        self.test_add_product_to_order()
+
+        url = "/cart"
+        response = self.client.get(url, None, format='json')
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        # Deletes do not move the newest updated_at of a set of rows
+        self.assertNotIn("Last-Modified", response)
+
+        response = self.client.get(url, None, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+        # Adding another item changes the validators
+        response = self.client.post(url, {"product_id": 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get(url, None, format='json', HTTP_IF_NONE_MATCH=etag)
+        json_response = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json_response["size"], 2)
+        self.assertNotEqual(response["ETag"], etag)
+
+        # Removing a line item changes the cart even for If-Modified-Since
+        response = self.client.delete("/cart/1")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get(
+            url, None, format='json', HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["size"], 1)
+
     def test_remove_product_from_order(self):
         """
         Ensure we can remove a product from an order.
@@ -92,6 +163,85 @@ class OrderTests(APITestCase):
         self.assertEqual(json_response["size"], 0)
         self.assertEqual(len(json_response["lineitems"]), 0)
 
+    def test_change_cart_quantities(self):
+        """
+        Ensure PATCH /cart applies every change or none of them
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        data = {"name": "Ball", "price": 5, "quantity": 3,
+                "description": "Round", "category_id": 1, "location": "Nashville"}
+        self.client.post("/products", data, format='json')
+
+        # Changes to the same product are added together
+        data = [{"product_id": 1, "delta": 2}, {"product_id": 2, "delta": 1},
+                {"product_id": 1, "delta": 1}]
+        response = self.client.patch("/cart", data, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json_response["size"], 4)
+        self.assertEqual([(item["product"]["id"], item["quantity"])
+                          for item in json_response["lineitems"]], [(1, 3), (2, 1)])
+
+        # Removing every unit removes the line item
+        data = [{"product_id": 1, "delta": -1}, {"product_id": 2, "delta": -5}]
+        response = self.client.patch("/cart", data, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(json_response["size"], 2)
+        self.assertEqual([(item["product"]["id"], item["quantity"])
+                          for item in json_response["lineitems"]], [(1, 2)])
+
+        # One invalid change rejects the whole request
+        data = [{"product_id": 2, "delta": 1}, {"product_id": 99, "delta": 1},
+                {"product_id": 1}]
+        response = self.client.patch("/cart", data, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error["index"] for error in json_response["errors"]], [2, 1])
+        response = self.client.get("/cart", None, format='json')
+        self.assertEqual(json.loads(response.content)["size"], 2)
+
+    def test_remove_deleted_product_from_cart(self):
+        """
+        Ensure a soft-deleted product in the cart can be removed but not added
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.client.patch("/cart", [{"product_id": 1, "delta": 2}], format='json')
+        response = self.client.delete("/products/1", None, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.patch("/cart", [{"product_id": 1, "delta": 1}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.patch("/cart", [{"product_id": 1, "delta": -2}], format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json_response["size"], 0)
+
+    def test_repeated_add_raises_quantity(self):
+        """
+        Ensure adding a product again raises its quantity instead of adding a line
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for _ in range(3):
+            self.client.post("/cart", {"product_id": 1}, format='json')
+        response = self.client.post("/profile/cart", {"product_id": 1}, format='json')
+        self.assertEqual(json.loads(response.content)["quantity"], 4)
+
+        # Deleting removes one unit at a time
+        response = self.client.delete("/cart/1")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get("/cart", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["size"], 3)
+        self.assertEqual(len(json_response["lineitems"]), 1)
+
+        response = self.client.delete("/cart/2")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     # Complete order by adding payment type
     def test_add_payment_type_to_order(self):
         """
@@ -117,6 +267,22 @@ class OrderTests(APITestCase):
         self.assertEqual(json_response["id"], 1)
         self.assertEqual(json_response["payment_type"].split("/")[-1], "1")
 
+    def test_orders_sparse_fields_and_expand(self):
+        """
+        Ensure orders honor ?fields= and ?expand=
+        """
+        self.test_add_payment_type_to_order()
+
+        response = self.client.get("/orders?fields=id,created_date", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(set(json_response[0]), {"id", "created_date"})
+
+        response = self.client.get("/orders/1?expand=payment_type,customer", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["payment_type"]["merchant_name"], "American Express")
+        self.assertEqual(json_response["customer"]["address"], "100 Infinity Way")
+        self.assertEqual(len(json_response["lineitems"]), 1)
+
     # TODO: New line item is not added to closed order
     def test_new_line_item_not_added_to_closed_order(self):
         """
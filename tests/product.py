@@ -1,15 +1,56 @@
-import json
+import base64
 import datetime
+import io
+import json
+import shutil
+import tempfile
+import time
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from django.core.cache import caches
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+from PIL import Image
+from bangazonapi.cache import get_version
+from bangazonapi.images import process_product_image
 from bangazonapi.models import Product
+from bangazonapi.views.product import PRODUCT_ORDERINGS, Products
+
+
+class CommitCallbackClient(APIClient):
+    """Runs the on_commit callbacks each request would run once it commits
+
+    TestCase wraps every test in a transaction that is never committed,
+    so callbacks such as the cache version bumps would never run.
+    """
+
+    def run_commit_callbacks(self):
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for _, callback in callbacks:
+            callback()
+
+    def request(self, **kwargs):
+        # Writes made directly in the test count as committed too
+        self.run_commit_callbacks()
+        response = super().request(**kwargs)
+        self.run_commit_callbacks()
+        return response
 
 
 class ProductTests(APITestCase):
+    client_class = CommitCallbackClient
+
     def setUp(self) -> None:
         """
         Create a new account and create sample category
         """
+        # The response cache is not rolled back with the test database
+        caches['products'].clear()
+
         # Creates primary user
         url = "/register"
         data = {"username": "steve", "password": "Admin8*", "email": "steve@stevebrownlee.com",
@@ -119,6 +160,271 @@ class ProductTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(json_response), 3)
 
+    def test_get_all_products_query_count(self):
+        """
+        Ensure listing products does not run extra queries per product
+        """
+        self.test_create_product()
+        self.test_create_product()
+
+        url = "/products"
+        with CaptureQueriesContext(connection) as few_products:
+            response = self.client.get(url, None, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.test_create_product()
+        self.test_create_product()
+
+        with CaptureQueriesContext(connection) as more_products:
+            response = self.client.get(url, None, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json_response), 4)
+        self.assertEqual(len(few_products), len(more_products))
+
+    def test_products_limit_offset_pagination(self):
+        """
+        Ensure products can be paged through with limit and offset
+        """
+        self.test_create_product()
+        self.test_create_product()
+        self.test_create_product()
+
+        url = "/products?limit=2&offset=1"
+        response = self.client.get(url, None, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json_response["count"], 3)
+        self.assertEqual(len(json_response["results"]), 2)
+        self.assertEqual(json_response["results"][0]["id"], 2)
+        self.assertIsNone(json_response["next"])
+
+    def test_products_keyset_pagination(self):
+        """
+        Ensure products can be paged through with a price cursor
+        """
+        url = "/products"
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for price in (30, 10, 20, 10, 50):
+            data = {"name": "Kite", "price": price, "quantity": 60, "description": "It flies high",
+                    "category_id": 1, "location": "Pittsburgh"}
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        url = "/products?cursor=&order_by=price&limit=2"
+        pages = []
+        while url is not None:
+            response = self.client.get(url, None, format='json')
+            json_response = json.loads(response.content)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", json_response)
+
+            pages.append([product["id"] for product in json_response["results"]])
+            url = json_response["next"]
+
+        self.assertEqual(pages, [[2, 4], [3, 1], [5]])
+
+        # Descending order walks the same keys backwards
+        url = "/products?cursor=&order_by=price&direction=desc&limit=3"
+        response = self.client.get(url, None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual([product["id"] for product in json_response["results"]], [5, 1, 3])
+
+        response = self.client.get(json_response["next"], None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual([product["id"] for product in json_response["results"]], [4, 2])
+        self.assertIsNone(json_response["next"])
+
+    def test_products_keyset_pagination_sparse_fields(self):
+        """
+        Ensure the default cursor works when `?fields=` leaves out its key
+        """
+        url = "/products"
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for price in (30, 10, 20):
+            data = {"name": "Kite", "price": price, "quantity": 60, "description": "It flies high",
+                    "category_id": 1, "location": "Pittsburgh"}
+            self.client.post(url, data, format='json')
+
+        response = self.client.get("/products?cursor=&limit=2&fields=id,name", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json_response["results"], [{"id": 1, "name": "Kite"}, {"id": 2, "name": "Kite"}])
+
+        response = self.client.get(json_response["next"], None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["results"], [{"id": 3, "name": "Kite"}])
+        self.assertIsNone(json_response["next"])
+
+    def test_products_sort_keys(self):
+        """
+        Ensure only the declared sort keys are accepted and ties are broken by id
+        """
+        url = "/products"
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for name in ("Kite", "Ball", "Kite"):
+            data = {"name": name, "price": 10, "quantity": 60, "description": "It flies high",
+                    "category_id": 1, "location": "Pittsburgh"}
+            self.client.post(url, data, format='json')
+        self.client.post("/products/3/rate", {"rating": 5}, format='json')
+
+        response = self.client.get("/products?order_by=name&direction=desc", None, format='json')
+        self.assertEqual([product["id"] for product in json.loads(response.content)], [3, 1, 2])
+
+        response = self.client.get("/products?order_by=average_rating&direction=desc", None, format='json')
+        self.assertEqual([product["id"] for product in json.loads(response.content)], [3, 2, 1])
+
+        url = "/products?cursor=&order_by=number_sold&limit=2"
+        response = self.client.get(url, None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual([product["id"] for product in json_response["results"]], [1, 2])
+        response = self.client.get(json_response["next"], None, format='json')
+        self.assertEqual([product["id"] for product in json.loads(response.content)["results"]], [3])
+
+        response = self.client.get("/products?order_by=customer__user__password", None, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_product_sort_keys_use_indexes(self):
+        """
+        Ensure every sort key is read from an index instead of being sorted
+        """
+        for key in PRODUCT_ORDERINGS:
+            for descending in (False, True):
+                products = Products.order_products(
+                    Product.objects.with_aggregates(), key, descending)[:20]
+                sql, params = products.query.sql_with_params()
+
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                    plan = " / ".join(row[-1] for row in cursor.fetchall())
+
+                self.assertIn("USING INDEX", plan, key)
+                self.assertNotIn("TEMP B-TREE", plan, key)
+
+    def test_cache_versions_bump_on_commit(self):
+        """
+        Ensure a write bumps the cache version only once its transaction commits
+        """
+        self.test_create_product()
+        before = get_version('product')
+
+        with transaction.atomic():
+            Product.objects.get(pk=1).save()
+            # A body built now would still read the old rows
+            self.assertEqual(get_version('product'), before)
+
+        self.client.run_commit_callbacks()
+        self.assertNotEqual(get_version('product'), before)
+
+    def test_product_responses_are_cached(self):
+        """
+        Ensure product bodies are served from the cache until a write invalidates them
+        """
+        self.test_create_product()
+
+        for url in ("/products", "/products/1"):
+            response = self.client.get(url, None, format='json')
+            self.assertEqual(response["X-Cache"], "MISS")
+
+            response = self.client.get(url, None, format='json')
+            self.assertEqual(response["X-Cache"], "HIT")
+
+        # Rating the product invalidates both bodies
+        response = self.client.post("/products/1/rate", {"rating": 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        for url in ("/products", "/products/1"):
+            response = self.client.get(url, None, format='json')
+            self.assertEqual(response["X-Cache"], "MISS")
+
+        # The secondary user gets the shared body with their own flags
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token_secondary)
+        response = self.client.get("/products/1", None, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(json_response["average_rating"], 4.0)
+        self.assertEqual(json_response["can_be_rated"], True)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.get("/products/1", None, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(json_response["can_be_rated"], False)
+
+        # Query params are normalized before building the cache key
+        self.client.get("/products?location=Pitts&min_price=1", None, format='json')
+        response = self.client.get("/products?min_price=1&location=Pitts", None, format='json')
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_product_cache_stats(self):
+        """
+        Ensure staff can read the hit and miss counts of this worker
+        """
+        self.test_create_product()
+        admin = User.objects.create_superuser("admin", "admin@email.com", "p@ssW0Rd")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=admin).key)
+
+        before = json.loads(self.client.get("/products/cachestats", None, format='json').content)
+        self.client.get("/products/1", None, format='json')
+        self.client.get("/products/1", None, format='json')
+        after = json.loads(self.client.get("/products/cachestats", None, format='json').content)
+
+        self.assertEqual((after["hits"] - before["hits"], after["misses"] - before["misses"]), (1, 1))
+
+    def test_product_conditional_get(self):
+        """
+        Ensure product validators change when the product's rating changes
+        """
+        self.test_create_product()
+
+        url = "/products/1"
+        response = self.client.get(url, None, format='json')
+        etag = response["ETag"]
+
+        response = self.client.get(url, None, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Another user sees a different ETag for the same product
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token_secondary)
+        response = self.client.get(url, None, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post("/products/1/rate", {"rating": 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.get(url, None, format='json', HTTP_IF_NONE_MATCH=etag)
+        json_response = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json_response["average_rating"], 3.0)
+
+    def test_product_list_conditional_get_after_delete(self):
+        """
+        Ensure deleting a product changes the list even for If-Modified-Since
+        """
+        self.test_create_product()
+        self.test_create_product()
+
+        response = self.client.get("/products", None, format='json')
+        self.assertNotIn("Last-Modified", response)
+
+        response = self.client.delete("/products/2")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get(
+            "/products", None, format='json', HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product["id"] for product in json.loads(response.content)], [1])
+
+        # A single product still sends Last-Modified
+        response = self.client.get("/products/1", None, format='json')
+        response = self.client.get(
+            "/products/1", None, format='json', HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
     def test_products_number_sold_query_param(self):
         """
         Ensure we can filter products based on the number sold
@@ -169,6 +475,29 @@ class ProductTests(APITestCase):
         self.assertEqual(len(json_response), 1)
         self.assertEqual(json_response[0]["id"], 1)
 
+    def test_products_combined_query_params(self):
+        """
+        Ensure the number sold, price and location filters compose with each other
+        """
+        self.test_products_number_sold_query_param()
+
+        url = "/products?number_sold=2&min_price=14&location=Pitts&quantity=5"
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.get(url, None, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json_response), 2)
+        self.assertEqual(
+            sorted(product["number_sold"] for product in json_response), [2, 3])
+
+        url = "/products?number_sold=2&min_price=15"
+        response = self.client.get(url, None, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json_response), 0)
+
     def test_products_min_price_query_param(self):
         """
         Ensure we can filter products based on a given minimum price
@@ -349,6 +678,344 @@ class ProductTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(json_response), 0)
 
+    def test_search_products(self):
+        """
+        Ensure products can be found by words and prefixes of their name and description
+        """
+        url = "/products"
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for name, description, price in (("Kite", "It flies high", 14.99),
+                                         ("Stunt kite", "A kite for kite tricks", 40),
+                                         ("Ball", "It bounces high", 5)):
+            data = {"name": name, "price": price, "quantity": 60, "description": description,
+                    "category_id": 1, "location": "Pittsburgh"}
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # The product mentioning kites the most ranks first
+        response = self.client.get("/products/search?q=kite", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product["id"] for product in json_response], [2, 1])
+
+        # Prefix matching on every word
+        response = self.client.get("/products/search?q=bou%20hi", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual([product["id"] for product in json_response], [3])
+
+        # Search composes with the list filters
+        response = self.client.get("/products/search?q=kite&min_price=20", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual([product["id"] for product in json_response], [2])
+
+        response = self.client.get("/products/search?q=", None, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Keyset pagination would drop the ranking, so only limit/offset pages
+        response = self.client.get("/products/search?q=kite&cursor=&limit=1", None, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get("/products/search?q=kite&limit=1&offset=1", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual([product["id"] for product in json_response["results"]], [1])
+
+    def test_search_index_follows_updates_and_deletes(self):
+        """
+        Ensure updated and deleted products are re-indexed
+        """
+        self.test_update_product()
+
+        url = "/products/1"
+        data = {"name": "Glider", "price": 24.99, "quantity": 40, "description": "It soars",
+                "category_id": 1, "created_date": datetime.date.today(), "location": "Pittsburgh"}
+        response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get("/products/search?q=kite", None, format='json')
+        self.assertEqual(json.loads(response.content), [])
+
+        response = self.client.get("/products/search?q=glider", None, format='json')
+        self.assertEqual(len(json.loads(response.content)), 1)
+
+        response = self.client.delete(url, None, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get("/products/search?q=glider", None, format='json')
+        self.assertEqual(json.loads(response.content), [])
+
+    def test_product_facets(self):
+        """
+        Ensure facet counts follow the product filters
+        """
+        url = "/products"
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for price, location in ((10, "Pittsburgh"), (30, "Pittsburgh"), (30, "Nashville"), (6000, "Nashville")):
+            data = {"name": "Kite", "price": price, "quantity": 60, "description": "It flies high",
+                    "category_id": 1, "location": location}
+            self.client.post(url, data, format='json')
+        self.client.delete("/products/4", None, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/products/facets", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Conditional GET validators, then one query per facet; the token is cached
+        self.assertEqual(len(queries), 4)
+
+        self.assertEqual(json_response["categories"], [{"id": 1, "name": "Sporting Goods", "count": 3}])
+        self.assertEqual(json_response["prices"][0], {"min": 0, "max": 25, "count": 1})
+        self.assertEqual(json_response["prices"][1], {"min": 25, "max": 50, "count": 2})
+        self.assertEqual(json_response["prices"][-1], {"min": 5000, "max": None, "count": 0})
+        self.assertEqual(json_response["locations"], [
+            {"location": "Pittsburgh", "count": 2}, {"location": "Nashville", "count": 1}])
+
+        response = self.client.get("/products/facets?min_price=20&location=Nash", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["categories"][0]["count"], 1)
+        self.assertEqual(json_response["locations"], [{"location": "Nashville", "count": 1}])
+
+        response = self.client.get("/products/facets?min_price=20&location=Nash", None, format='json')
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_products_sparse_fields_and_expand(self):
+        """
+        Ensure ?fields= trims products and skips the queries behind dropped fields
+        """
+        self.test_create_product()
+        self.test_create_product()
+
+        url = "/products?fields=id,name,price"
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response, [
+            {"id": 1, "name": "Kite", "price": 14.99}, {"id": 2, "name": "Kite", "price": 14.99}])
+        # No customer flag queries and no stats join
+        self.assertFalse(any("productrating" in query["sql"] for query in queries.captured_queries))
+        product_queries = [query["sql"] for query in queries.captured_queries
+                           if '"bangazonapi_product"."name"' in query["sql"]]
+        self.assertEqual(len(product_queries), 1)
+        self.assertNotIn("productstats", product_queries[0])
+
+        response = self.client.get("/products/1?fields=id,liked_by_me&expand=category", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["liked_by_me"], False)
+        self.assertEqual(json_response["category"]["name"], "Sporting Goods")
+        self.assertEqual(set(json_response), {"id", "liked_by_me", "category"})
+
+    def test_export_products(self):
+        """
+        Ensure the catalog can be exported as a JSON array and as JSON Lines
+        """
+        self.test_create_product()
+        self.test_create_product()
+
+        response = self.client.get("/products", None, format='json')
+        listed = json.loads(response.content)
+        for product in listed:
+            del product["can_be_rated"]
+            del product["liked_by_me"]
+
+        response = self.client.get("/products/export", None, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), listed)
+
+        response = self.client.get("/products/export?output=jsonl", None, format='json')
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([json.loads(line) for line in lines], listed)
+
+        # Incremental feeds only get products changed since the given time
+        response = self.client.get("/products/export?since=2999-01-01", None, format='json')
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), [])
+
+        response = self.client.get("/products/export?since=yesterday", None, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_and_update_products(self):
+        """
+        Ensure many products can be created and updated in one request
+        """
+        url = "/products/bulk"
+        data = [
+            {"name": f"Kite {number}", "price": 14.99, "quantity": 60, "description": "It flies high",
+             "category_id": 1, "location": "Pittsburgh"}
+            for number in range(3)
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.post(url, data, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json_response["ids"], [1, 2, 3])
+
+        response = self.client.get("/products/2", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["name"], "Kite 1")
+        self.assertEqual(json_response["number_sold"], 0)
+
+        response = self.client.get("/products/search?q=kite", None, format='json')
+        self.assertEqual(len(json.loads(response.content)), 3)
+
+        data = [dict(row, id=index + 1, price=24.99) for index, row in enumerate(data)]
+        data[2]["name"] = "Glider"
+        response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get("/products", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual([product["price"] for product in json_response], [24.99] * 3)
+
+        response = self.client.get("/products/search?q=glider", None, format='json')
+        self.assertEqual([product["id"] for product in json.loads(response.content)], [3])
+
+        # Other sellers cannot bulk update these products
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token_secondary)
+        response = self.client.put(url, data[:1], format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(json_response["errors"][0]["message"], {"id": ["Product does not exist."]})
+
+    def test_bulk_create_products_reports_row_errors(self):
+        """
+        Ensure invalid rows are reported by index and nothing is written
+        """
+        url = "/products/bulk"
+        valid = {"name": "Kite", "price": 14.99, "quantity": 60, "description": "It flies high",
+                 "category_id": 1, "location": "Pittsburgh"}
+        data = [valid, dict(valid, price=17500.01), dict(valid, category_id=99), {"name": "Kite"}]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.post(url, data, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error["index"] for error in json_response["errors"]], [1, 2, 3])
+        self.assertIn("price", json_response["errors"][0]["message"])
+        self.assertIn("category_id", json_response["errors"][1]["message"])
+        self.assertIn("quantity", json_response["errors"][2]["message"])
+        self.assertEqual(Product.objects.count(), 0)
+
+        response = self.client.post(url, {"name": "Kite"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_products_without_customer(self):
+        """
+        Ensure a user without a customer gets a 404 instead of a failed insert
+        """
+        admin = User.objects.create_superuser("admin", "admin@email.com", "p@ssW0Rd")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=admin).key)
+
+        data = [{"name": "Kite", "price": 14.99, "quantity": 60, "description": "It flies high",
+                 "category_id": 1, "location": "Pittsburgh"}]
+        for method in (self.client.post, self.client.put):
+            response = method("/products/bulk", data, format='json')
+            json_response = json.loads(response.content)
+
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+            self.assertEqual(json_response["message"], "Customer matching query does not exist.")
+        self.assertEqual(Product.objects.count(), 0)
+
+    def test_create_product_with_image(self):
+        """
+        Ensure product images are processed after the product is created
+        """
+        image = Image.new("RGB", (1200, 900), "blue")
+        exif = Image.Exif()
+        exif[0x010F] = "Camera Maker"
+        upload = io.BytesIO()
+        image.save(upload, format="JPEG", exif=exif)
+        data_url = "data:image/jpeg;base64," + base64.b64encode(upload.getvalue()).decode()
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with override_settings(MEDIA_ROOT=media_root, IMAGE_PROCESSING_WORKERS=0):
+            url = "/products"
+            data = {"name": "Kite", "price": 14.99, "quantity": 60, "description": "It flies high",
+                    "category_id": 1, "location": "Pittsburgh", "image_path": data_url}
+            self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+            response = self.client.post(url, data, format='json')
+            json_response = json.loads(response.content)
+
+            # The test transaction never commits, so the image is still pending
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(json_response["image_status"], "pending")
+            self.assertIsNone(json_response["image_thumbnail"])
+
+            process_product_image(json_response["id"], data_url)
+
+            response = self.client.get(f"/products/{json_response['id']}", None, format='json')
+            json_response = json.loads(response.content)
+            self.assertEqual(json_response["image_status"], "ready")
+            self.assertTrue(json_response["image_thumbnail"].endswith(".jpg"))
+
+            product = Product.objects.get(pk=json_response["id"])
+            for field, size in (("image_path", (1200, 900)), ("image_thumbnail", (150, 113)),
+                                ("image_medium", (600, 450))):
+                with Image.open(getattr(product, field).path) as stored:
+                    self.assertEqual(stored.size, size)
+                    self.assertNotIn("exif", stored.info)
+
+            with self.assertLogs("bangazonapi.images", level="WARNING"):
+                process_product_image(product.id, "data:image/jpeg;base64,bm90IGFuIGltYWdl")
+            product.refresh_from_db()
+            self.assertEqual(product.image_status, Product.IMAGE_FAILED)
+
+    def test_upload_product_image(self):
+        """
+        Ensure product images can be uploaded as multipart form data
+        """
+        self.test_create_product()
+
+        image = Image.new("RGB", (800, 400), "red")
+        upload = io.BytesIO()
+        image.save(upload, format="PNG")
+        upload.seek(0)
+        upload.name = "kite.png"
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with override_settings(MEDIA_ROOT=media_root, IMAGE_PROCESSING_WORKERS=0):
+            url = "/products/1/image"
+            response = self.client.put(url, {"image": upload}, format='multipart')
+            json_response = json.loads(response.content)
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(json_response["image_status"], "pending")
+            self.assertTrue(json_response["image_path"].endswith(".png"))
+
+            process_product_image(1)
+
+            product = Product.objects.get(pk=1)
+            self.assertEqual(product.image_status, Product.IMAGE_READY)
+            with Image.open(product.image_thumbnail.path) as stored:
+                self.assertEqual(stored.size, (150, 75))
+
+            # The file contents decide the type, not the name or content type
+            fake = io.BytesIO(b"not an image at all")
+            fake.name = "kite.png"
+            response = self.client.put(url, {"image": fake}, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+            response = self.client.put(url, {}, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+            upload.seek(0)
+            with override_settings(PRODUCT_IMAGE_MAX_BYTES=100):
+                response = self.client.put(url, {"image": upload}, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+            self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token_secondary)
+            upload.seek(0)
+            response = self.client.put(url, {"image": upload}, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+            # A user without a customer owns no products
+            admin = User.objects.create_superuser("admin", "admin@email.com", "p@ssW0Rd")
+            self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=admin).key)
+            upload.seek(0)
+            response = self.client.put(url, {"image": upload}, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_like_product(self):
         """
         Ensure that we can like a product
@@ -502,6 +1169,34 @@ class ProductTests(APITestCase):
         self.assertEqual(json_response["average_rating"], 3.0)
         self.assertEqual(json_response["can_be_rated"], False)
 
+    def test_customer_flags_on_product_list(self):
+        """
+        Ensure listed products carry can_be_rated and liked_by_me for the customer
+        """
+        self.test_rate_product()
+        self.test_create_product()
+
+        url = "/products/2/like"
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.post(url, None, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get("/products", None, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product["can_be_rated"] for product in json_response], [False, True])
+        self.assertEqual([product["liked_by_me"] for product in json_response], [False, True])
+
+        # Anonymous requests leave the per-customer fields out
+        self.client.credentials()
+        response = self.client.get("/products/1", None, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("can_be_rated", json_response)
+        self.assertNotIn("liked_by_me", json_response)
+
     def test_duplicate_ratings_not_allowed(self):
         """
         Ensure a user cannot rate a product more than once
@@ -0,0 +1,133 @@
+import json
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from bangazonapi.models import Customer, Product, ProductCategory, ProductStats
+from bangazonapi.views.product import (
+    LikedSerializer, ProductRowSerializer, ProductSerializer)
+
+
+class ProductRowsTests(APITestCase):
+    """
+    Check that the fast product serializer renders the same bytes as ProductSerializer
+    """
+
+    def setUp(self) -> None:
+        # The response cache is not rolled back with the test database
+        caches['products'].clear()
+
+        user = User.objects.create_user(username="seller", password="Admin8*")
+        self.customer = Customer.objects.create(
+            user=user, phone_number="555-1212", address="100 Infinity Way")
+        self.category = ProductCategory.objects.create(name="Sporting Goods")
+
+        self.products = [
+            Product.objects.create(
+                name=f"Kite {index}", customer=self.customer, price=10 + index * 2.5,
+                description="It flies high", quantity=index, category=self.category,
+                location="Pittsburgh")
+            for index in range(6)
+        ]
+        self.ids = [product.id for product in self.products]
+
+    def assertSameBody(self, query=""):
+        """Render both serializers for a GET /products request with `query`"""
+        request = Request(APIRequestFactory().get(f"/products{query}"))
+        products = Product.objects.with_aggregates().order_by("id")
+
+        expected = ProductSerializer(
+            products, many=True,
+            context={'request': request, 'customer_flags': False}).data
+
+        rows = ProductRowSerializer(request)
+        actual = rows.to_representation(rows.values(products))
+
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+        return actual
+
+    def test_default_fields(self):
+        """
+        Ensure every default field is rendered the same way
+        """
+        ProductStats.objects.filter(product_id=self.ids[0]).update(
+            sold_count=3, rating_sum=9, rating_count=2, average_rating=4.5)
+        Product.objects.filter(pk=self.ids[1]).update(price=20)
+
+        rows = self.assertSameBody()
+        self.assertEqual(rows[0]["number_sold"], 3)
+        self.assertEqual(rows[0]["average_rating"], 4.5)
+
+    def test_sparse_fields_and_expand(self):
+        """
+        Ensure ?fields= and ?expand=category are honored
+        """
+        rows = self.assertSameBody("?fields=name,price")
+        self.assertEqual(list(rows[0]), ["id", "name", "price"])
+
+        rows = self.assertSameBody("?fields=name&expand=category")
+        self.assertEqual(rows[0]["category"]["name"], "Sporting Goods")
+
+        self.assertSameBody("?expand=category")
+        self.assertSameBody("?fields=number_sold,average_rating")
+
+    def test_images(self):
+        """
+        Ensure stored images render as absolute URLs and missing ones as null
+        """
+        Product.objects.filter(pk=self.ids[0]).update(
+            image_path="products/1.jpg", image_thumbnail="products/thumbnails/1.jpg",
+            image_status=Product.IMAGE_READY)
+        Product.objects.filter(pk=self.ids[1]).update(image_path="", image_status=Product.IMAGE_FAILED)
+
+        rows = self.assertSameBody()
+        self.assertTrue(rows[0]["image_path"].startswith("http://testserver/"))
+        self.assertIsNone(rows[1]["image_path"])
+
+    def test_deleted_and_missing_stats(self):
+        """
+        Ensure soft-deleted products stay out and products without stats render zeros
+        """
+        Product.objects.get(pk=self.ids[2]).delete()
+        ProductStats.objects.filter(product_id=self.ids[4]).update(sold_count=2)
+        # A row removed behind the handlers' back, e.g. from the shell
+        ProductStats.objects.filter(product_id=self.ids[0]).delete()
+
+        rows = self.assertSameBody()
+        self.assertNotIn(self.ids[2], [row["id"] for row in rows])
+        self.assertEqual([row["number_sold"] for row in rows], [0, 0, 0, 2, 0])
+
+    def test_paginated_list(self):
+        """
+        Ensure the paginated list walks every product with the fast serializer
+        """
+        ids = []
+        url = "/products?order_by=price&direction=desc&cursor=&limit=4"
+        while url:
+            response = self.client.get(url)
+            json_response = json.loads(response.content)
+            ids += [row["id"] for row in json_response["results"]]
+            url = json_response["next"]
+
+        self.assertEqual(ids, self.ids[::-1])
+
+    def test_liked_matches_serializer(self):
+        """
+        Ensure the liked list renders the same as LikedSerializer
+        """
+        token = self.client.post("/register", {
+            "username": "steve", "password": "Admin8*", "email": "steve@stevebrownlee.com",
+            "address": "100 Infinity Way", "phone_number": "555-1212",
+            "first_name": "Steve", "last_name": "Brownlee"}, format='json').json()["token"]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        for product_id in (self.ids[1], self.ids[4]):
+            self.client.post(f"/products/{product_id}/like")
+
+        response = self.client.get("/products/liked")
+
+        request = Request(APIRequestFactory().get("/products/liked"))
+        likes = Customer.objects.get(user__username="steve").likeproduct_set.all()
+        expected = LikedSerializer(likes, many=True, context={'request': request}).data
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+        self.assertEqual(len(expected), 2)
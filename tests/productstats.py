@@ -0,0 +1,157 @@
+import datetime
+import json
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.test import APITestCase
+from bangazonapi.models import Customer, Product, ProductCategory, ProductStats
+
+
+class ProductStatsTests(APITestCase):
+    def setUp(self) -> None:
+        """
+        Create an account, a product and a payment type
+        """
+        # The response cache is not rolled back with the test database
+        caches['products'].clear()
+
+        url = "/register"
+        data = {"username": "steve", "password": "Admin8*", "email": "steve@stevebrownlee.com",
+                "address": "100 Infinity Way", "phone_number": "555-1212", "first_name": "Steve", "last_name": "Brownlee"}
+        response = self.client.post(url, data, format='json')
+        json_response = json.loads(response.content)
+        self.token = json_response["token"]
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        url = "/productcategories"
+        data = {"name": "Sporting Goods"}
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.post(url, data, format='json')
+
+        url = "/products"
+        data = {"name": "Kite", "price": 14.99, "quantity": 60,
+                "description": "It flies high", "category_id": 1, "location": "Pittsburgh"}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        url = "/paymenttypes"
+        data = {
+            "merchant_name": "American Express",
+            "account_number": "111-1111-1111",
+            "expiration_date": "2024-12-31",
+            "create_date": datetime.date.today()
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def complete_order(self, units):
+        """
+        Add `units` of the product to the cart and pay for it
+        """
+        for _ in range(units):
+            response = self.client.post("/cart", {"product_id": 1}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get("/cart", None, format='json')
+        order_id = json.loads(response.content)["id"]
+
+        response = self.client.put(f"/orders/{order_id}", {"payment_type": 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_stats_follow_sales_ratings_and_likes(self):
+        """
+        Ensure the stats row is updated by checkout, rating and liking
+        """
+        self.complete_order(2)
+
+        self.client.post("/products/1/rate", {"rating": 4}, format='json')
+        self.client.post("/products/1/like", None, format='json')
+
+        stats = ProductStats.objects.get(product_id=1)
+        self.assertEqual(stats.sold_count, 2)
+        self.assertEqual(stats.rating_sum, 4)
+        self.assertEqual(stats.rating_count, 1)
+        self.assertEqual(stats.like_count, 1)
+
+        # Paying for an already paid order does not count it twice
+        response = self.client.put("/orders/1", {"payment_type": 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.client.delete("/products/1/like", None, format='json')
+
+        stats.refresh_from_db()
+        self.assertEqual(stats.sold_count, 2)
+        self.assertEqual(stats.like_count, 0)
+
+        response = self.client.get("/products/1", None, format='json')
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["number_sold"], 2)
+        self.assertEqual(json_response["average_rating"], 4.0)
+
+    def test_missing_stats_row_is_rebuilt_on_write(self):
+        """
+        Ensure a product without a stats row gets one from the source tables
+        """
+        self.complete_order(3)
+        ProductStats.objects.all().delete()
+
+        self.client.post("/products/1/rate", {"rating": 2}, format='json')
+
+        stats = ProductStats.objects.get(product_id=1)
+        self.assertEqual(stats.sold_count, 3)
+        self.assertEqual(stats.rating_count, 1)
+
+    def test_products_saved_outside_the_views_have_stats(self):
+        """
+        Ensure products created directly get a stats row and sort with the rest
+        """
+        product = Product.objects.create(
+            name="Ball", price=5, description="It bounces", quantity=10, location="Pittsburgh",
+            customer=Customer.objects.get(pk=1), category=ProductCategory.objects.get(pk=1))
+        self.assertEqual(ProductStats.objects.get(product=product).sold_count, 0)
+
+        for key in ("number_sold", "average_rating"):
+            response = self.client.get(f"/products?order_by={key}", None, format='json')
+            self.assertEqual([row["id"] for row in json.loads(response.content)], [1, product.id])
+
+        # Migrating backfills rows that are missing anyway
+        ProductStats.objects.filter(product=product).delete()
+        self.assertEqual(ProductStats.objects.create_missing(), 1)
+        self.assertTrue(ProductStats.objects.filter(product=product).exists())
+
+    def test_number_sold_filter_keeps_products_saved_directly(self):
+        """
+        Ensure ?number_sold=0 and the facets count products created outside the views
+        """
+        Product.objects.create(
+            name="Ball", price=5, description="It bounces", quantity=10, location="Pittsburgh",
+            customer=Customer.objects.get(pk=1), category=ProductCategory.objects.get(pk=1))
+        self.complete_order(1)
+
+        response = self.client.get("/products?number_sold=0", None, format='json')
+        self.assertEqual(len(json.loads(response.content)), 2)
+
+        response = self.client.get("/products?number_sold=1", None, format='json')
+        self.assertEqual([row["id"] for row in json.loads(response.content)], [1])
+
+        response = self.client.get("/products/facets?number_sold=0", None, format='json')
+        self.assertEqual(json.loads(response.content)["categories"][0]["count"], 2)
+
+    def test_rebuild_command_repairs_drift(self):
+        """
+        Ensure the rebuild command reports and repairs drifted counters
+        """
+        self.complete_order(1)
+        ProductStats.objects.filter(product_id=1).update(sold_count=10)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_productstats', '--check', stdout=StringIO())
+
+        out = StringIO()
+        call_command('rebuild_productstats', stdout=out)
+        self.assertIn("sold_count is 10, expected 1", out.getvalue())
+        self.assertEqual(ProductStats.objects.get(product_id=1).sold_count, 1)
+
+        call_command('rebuild_productstats', '--check', stdout=StringIO())
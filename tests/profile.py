@@ -1,7 +1,12 @@
 import json
+import time
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
 from django.contrib.auth.models import User
+from django.test import override_settings
+from bangazonapi.authentication import CustomerTokenAuthentication, token_cache
 from bangazonapi.models import Customer
 from rest_framework.authtoken.models import Token
 
@@ -78,6 +83,100 @@ class ProfileTests(APITestCase):
         self.assertEqual(json_response["user"]["first_name"], "firstName")
         self.assertEqual(json_response["phone_number"], "99999")
 
+    def test_token_authentication_loads_customer(self):
+        """
+        Ensure the token, user and customer are read in a single query
+        """
+        def authenticate(token):
+            request = Request(APIRequestFactory().get(
+                "/profile", HTTP_AUTHORIZATION=f"Token {token}"))
+            CustomerTokenAuthentication().authenticate(request)
+            return request
+
+        with override_settings(AUTH_TOKEN_CACHE_TTL=0), self.assertNumQueries(1):
+            request = authenticate(self.new_user1_token)
+            self.assertEqual(request.customer.id, 2)
+            self.assertEqual(request.customer.user.username, "first")
+
+        # Users without a customer, like a bare superuser, still authenticate
+        admin = User.objects.create_superuser("admin", "admin@email.com", "p@ssW0Rd")
+        self.assertIsNone(authenticate(Token.objects.create(user=admin).key).customer)
+
+        with self.assertRaises(AuthenticationFailed):
+            authenticate("not-a-token")
+
+    def test_token_cache(self):
+        """
+        Ensure cached tokens skip the database until they are revoked
+        """
+        def authenticate(token):
+            request = Request(APIRequestFactory().get(
+                "/profile", HTTP_AUTHORIZATION=f"Token {token}"))
+            CustomerTokenAuthentication().authenticate(request)
+            return request
+
+        user = User.objects.get(username="first")
+        authenticate(self.new_user1_token)
+        with self.assertNumQueries(0):
+            request = authenticate(self.new_user1_token)
+            self.assertEqual(request.customer.id, 2)
+            self.assertEqual(request.customer.user_id, user.id)
+
+        # The profile reads the rest of the cached customer in one query
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.new_user1_token)
+        response = self.client.get("/profile", None, format='json')
+        self.assertEqual(json.loads(response.content)["phone_number"], "99999")
+
+        # Deactivating the user drops the cached tokens
+        user.is_active = False
+        user.save()
+        with self.assertRaises(AuthenticationFailed):
+            authenticate(self.new_user1_token)
+
+        # So does deleting a token, even when this worker cached it
+        authenticate(self.new_user2_token)
+        Token.objects.filter(key=self.new_user2_token).delete()
+        with self.assertRaises(AuthenticationFailed):
+            authenticate(self.new_user2_token)
+
+        # Entries past their TTL are read again
+        token = Token.objects.create(user=User.objects.get(username="second")).key
+        with override_settings(AUTH_TOKEN_CACHE_TTL=0.01):
+            authenticate(token)
+            time.sleep(0.02)
+            with self.assertNumQueries(1):
+                authenticate(token)
+
+        token_cache.clear()
+
+    def test_profile_update_changes_etag(self):
+        """
+        Ensure updating a customer from a cached token changes the profile ETag
+        """
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.new_user1_token)
+        self.client.get("/profile", None, format='json')
+        # Served from the token cache, so request.customer only has its ids
+        etag = self.client.get("/profile", None, format='json')["ETag"]
+
+        # Only customer columns change, so only its updated_at moves the ETag
+        data = {"last_name": "lastName", "email": "email@email.com",
+                "address": "cccc", "phone_number": "88888"}
+        response = self.client.put("/customers/2", data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get("/profile", None, format='json', HTTP_IF_NONE_MATCH=etag)
+        json_response = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json_response["address"], "cccc")
+
+        # User fields have no updated_at of their own
+        etag = response["ETag"]
+        User.objects.filter(username="first").update(first_name="Renamed")
+        response = self.client.get("/profile", None, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        token_cache.clear()
+
     def test_add_new_favorite_seller(self):
         """
         Ensure we can add a favorite seller
@@ -92,6 +191,35 @@ class ProfileTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_profile_favorites_change_etag(self):
+        """
+        Ensure adding a favorite seller changes the ETag of the expanded profile
+        """
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.new_user1_token)
+        url = "/profile?expand=favorites"
+        etag = self.client.get(url, None, format='json')["ETag"]
+
+        self.test_add_new_favorite_seller()
+
+        response = self.client.get(url, None, format='json', HTTP_IF_NONE_MATCH=etag)
+        json_response = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json_response["favorites"]), 1)
+
+    def test_profile_sparse_fields_and_expand(self):
+        """
+        Ensure the profile honors ?fields= and ?expand=
+        """
+        self.test_add_new_favorite_seller()
+
+        url = "/profile?fields=id,user&expand=favorites"
+        response = self.client.get(url, None, format='json')
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(json_response), {"id", "user", "favorites"})
+        self.assertEqual(json_response["favorites"][0]["seller"]["id"], 1)
+
     def test_do_not_add_new_favorite_seller_that_does_not_exist(self):
         """
         Ensure we cannot add a favorite seller that doesn't exist
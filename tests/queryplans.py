@@ -0,0 +1,75 @@
+from django.db import connection
+from django.test import TestCase
+from bangazonapi.models import Order, OrderProduct, Product, ProductRating
+from bangazonreports.views.products.completedorders import COMPLETED_ORDERS_SQL
+from bangazonreports.views.products.expensiveproducts import EXPENSIVE_PRODUCTS_SQL
+from bangazonreports.views.products.incompleteorders import INCOMPLETE_ORDERS_SQL
+from bangazonreports.views.products.inexpensiveproducts import INEXPENSIVE_PRODUCTS_SQL
+
+# SQLite backs the (order, product) unique constraint with an automatic index
+ORDERPRODUCT_UNIQUE_INDEX = "sqlite_autoindex_bangazonapi_orderproduct_1"
+
+
+class QueryPlanTests(TestCase):
+    """
+    Check that the hot queries are answered from the composite indexes
+    """
+
+    def query_plan(self, query, params=()):
+        """EXPLAIN QUERY PLAN of SQL text or of a queryset, as one string"""
+        if not isinstance(query, str):
+            # Slicing applies safedelete's deleted filter, like evaluation does
+            query, params = query[:20].query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            return " / ".join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, query, index):
+        plan = self.query_plan(query)
+        self.assertIn(f"INDEX {index}", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_cart_query_plans(self):
+        """
+        Ensure the open order and its line items are found through indexes
+        """
+        self.assertUsesIndex(
+            Order.objects.filter(customer_id=1, payment_type=None), "order_open_uniq")
+        self.assertUsesIndex(
+            OrderProduct.objects.filter(order_id=1, product_id=1),
+            ORDERPRODUCT_UNIQUE_INDEX)
+        self.assertUsesIndex(
+            OrderProduct.objects.filter(order_id=1).order_by("product_id"),
+            ORDERPRODUCT_UNIQUE_INDEX)
+
+    def test_orders_query_plans(self):
+        """
+        Ensure a customer's orders are listed in date order from an index
+        """
+        self.assertUsesIndex(
+            Order.objects.filter(customer_id=1).order_by("created_date", "id"),
+            "order_customer_created_idx")
+
+    def test_products_query_plans(self):
+        """
+        Ensure category listings and the customer's ratings use indexes
+        """
+        self.assertUsesIndex(
+            Product.objects.filter(category_id=1).order_by("-created_date", "-id"),
+            "product_live_category_idx")
+        self.assertUsesIndex(
+            Product.objects.filter(price__gte=100).order_by("price", "id"),
+            "product_price_idx")
+        self.assertUsesIndex(
+            ProductRating.objects.filter(customer_id=1, product_id__in=[1, 2, 3]),
+            "productrating_customer_idx")
+
+    def test_report_query_plans(self):
+        """
+        Ensure the report queries use indexes instead of sorting
+        """
+        self.assertUsesIndex(EXPENSIVE_PRODUCTS_SQL, "product_price_idx")
+        self.assertUsesIndex(INEXPENSIVE_PRODUCTS_SQL, "product_price_idx")
+        self.assertUsesIndex(INCOMPLETE_ORDERS_SQL, ORDERPRODUCT_UNIQUE_INDEX)
+        self.assertNotIn("TEMP B-TREE", self.query_plan(COMPLETED_ORDERS_SQL))
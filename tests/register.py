@@ -0,0 +1,108 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from bangazonapi.models import Customer
+
+
+class RegisterTests(APITestCase):
+    def register(self, username="steve"):
+        url = "/register"
+        data = {"username": username, "password": "Admin8*", "email": "steve@STEVEBROWNLEE.com",
+                "address": "100 Infinity Way", "phone_number": "555-1212", "first_name": "Steve", "last_name": "Brownlee"}
+        return self.client.post(url, data, format='json')
+
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, "w") as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_register_user(self):
+        """
+        Ensure registration creates the user, customer and token in one transaction
+        """
+        # Three INSERTs, inside a savepoint because tests run in a transaction
+        with self.assertNumQueries(5):
+            response = self.register()
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = User.objects.get(pk=json_response["id"])
+        self.assertTrue(user.check_password("Admin8*"))
+        self.assertEqual(user.email, "steve@stevebrownlee.com")
+        self.assertEqual(Token.objects.get(user=user).key, json_response["token"])
+        self.assertEqual(Customer.objects.get(user=user).phone_number, "555-1212")
+
+        # A taken username is rejected without leaving anything behind
+        response = self.register()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_register_user_rolls_back(self):
+        """
+        Ensure a failure part way through registration leaves no orphan user
+        """
+        with mock.patch.object(Token.objects, "create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.register()
+
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Customer.objects.exists())
+
+    def test_import_customers(self):
+        """
+        Ensure customers are imported from CSV and JSON Lines files
+        """
+        csv_path = self.write_file(".csv", (
+            "username,email,password,first_name,last_name,phone_number,address\n"
+            "ann,ann@example.com,Secret1*,Ann,Lee,555-0001,1 Main St\n"
+            "bob,bob@example.com,Secret2*,Bob,Ray,555-0002,2 Main St\n"))
+        call_command("import_customers", csv_path, workers=2, stdout=io.StringIO())
+
+        jsonl_path = self.write_file(".jsonl", json.dumps({
+            "username": "cat", "email": "cat@example.com", "password": "Secret3*",
+            "first_name": "Cat", "last_name": "Fox", "phone_number": "555-0003",
+            "address": "3 Main St"}) + "\n")
+        call_command("import_customers", jsonl_path, workers=1, stdout=io.StringIO())
+
+        self.assertEqual(Customer.objects.count(), 3)
+        bob = User.objects.get(username="bob")
+        self.assertTrue(bob.check_password("Secret2*"))
+        self.assertEqual(bob.customer.address, "2 Main St")
+
+        # The imported users can log in and use their token
+        response = self.client.post("/login", {"username": "cat", "password": "Secret3*"}, format='json')
+        token = json.loads(response.content)["token"]
+        self.assertEqual(Token.objects.get(user__username="cat").key, token)
+
+        # Taken or incomplete rows abort the whole import
+        bad_path = self.write_file(".csv", (
+            "username,email,password,first_name,last_name,phone_number,address\n"
+            "dan,dan@example.com,Secret4*,Dan,Day,555-0004,4 Main St\n"
+            "ann,ann@example.com,Secret1*,Ann,Lee,555-0001,1 Main St\n"
+            "eve,,Secret5*,Eve,Ng,555-0005,5 Main St\n"))
+        with self.assertRaises(CommandError):
+            call_command("import_customers", bad_path, workers=1, stderr=io.StringIO())
+        self.assertFalse(User.objects.filter(username="dan").exists())
+
+        # Usernames are compared after the normalization applied on insert
+        clash_path = self.write_file(".csv", (
+            "username,email,password,first_name,last_name,phone_number,address\n"
+            "\ufb01ona,fiona@example.com,Secret6*,Fiona,Ward,555-0006,6 Main St\n"
+            "fiona,fiona@example.com,Secret6*,Fiona,Ward,555-0006,6 Main St\n"
+            "\uff41nn,ann@example.com,Secret1*,Ann,Lee,555-0001,1 Main St\n"))
+        stderr = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command("import_customers", clash_path, workers=1, stderr=stderr)
+        self.assertIn("username fiona appears more than once", stderr.getvalue())
+        self.assertIn("Username ann is already taken", stderr.getvalue())
+        self.assertEqual(Customer.objects.count(), 3)